@@ -1,17 +1,36 @@
 import streamlit as st
-import pandas as pd
-import random
 import time
-from datetime import datetime
-from urllib.parse import urlparse
+import os
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import decimal
+import instrumentation
+import db
+import jobs
+import settlement
+from lazy import lazy_import, is_available
 
-# Check if required packages are installed
-try:
-    import snowflake.connector
-    SNOWFLAKE_AVAILABLE = True
-except ImportError:
-    SNOWFLAKE_AVAILABLE = False
+# Heavy modules load on first use, so the navigation shell paints before they are imported
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+race_engine = lazy_import("race_engine")
+standings = lazy_import("standings")
+season = lazy_import("season")
+telemetry = lazy_import("telemetry")
+bulk_import = lazy_import("bulk_import")
+local_db = lazy_import("local_db")
+optimizer = lazy_import("optimizer")
+archive = lazy_import("archive")
+
+# Check if required packages are installed (without importing them)
+SNOWFLAKE_AVAILABLE = is_available("snowflake.connector")
+DUCKDB_AVAILABLE = is_available("duckdb")
+
+# Time budget for the navigation shell to appear, measured from process start on a
+# cold start and from the start of the script run otherwise
+FIRST_PAINT_BUDGET_S = 1.0
 
 # Demo data for when Snowflake is not available
 def get_demo_data():
@@ -39,55 +58,60 @@ def get_demo_data():
     
     return teams, cars, races
 
-@st.cache_resource
-def init_connection():
+# Build the Snowflake pool, open and warm its first session and check the
+# database. Runs on a background thread; returns (pool, version, error message).
+def connect_snowflake(secrets):
+    if secrets is None:
+        return None, None, "Snowflake credentials not found in secrets!"
     try:
-        # Check if secrets are configured
-        if 'snowflake' not in st.secrets:
-            st.error("Snowflake credentials not found in secrets!")
-            return None
-        
-        # Get account from secrets and clean it 
-        raw_account = st.secrets["snowflake"]["account"]
-        
-        # Parse the account from URL if it's a full URL
-        if raw_account.startswith('https://'):
-            parsed_url = urlparse(raw_account)
-            account = parsed_url.netloc.replace('.snowflakecomputing.com', '')
-        else:
-            account = raw_account
-        
-        st.sidebar.info(f"Connecting to account: {account}")
-            
-        # Connect to Snowflake 
-        conn = snowflake.connector.connect(
-            user=st.secrets["snowflake"]["user"],
-            password=st.secrets["snowflake"]["password"],
-            account=account,
-            warehouse=st.secrets["snowflake"].get("warehouse", "COMPUTE_WH"),
-            database=st.secrets["snowflake"].get("database", "BOOTCAMP_RALLY"),
-            schema=st.secrets["snowflake"].get("schema", "PUBLIC"),
-            role=st.secrets["snowflake"].get("role", "SYSADMIN"),
-            client_session_keep_alive=True
-        )
-        
+        # Sessions are shared by all users through a bounded pool
+        pool = db.snowflake_pool(secrets)
         # Test the connection with a simple query
-        with conn.cursor() as cur:
-            cur.execute("SELECT CURRENT_VERSION()")
-            version = cur.fetchone()
-            st.sidebar.success(f"✅ Connected to Snowflake v{version[0]}")
-            
-        return conn
-        
-    except snowflake.connector.errors.DatabaseError as db_err:
-        st.error(f"Database error: {db_err}")
-        return None
-    except snowflake.connector.errors.ProgrammingError as prog_err:
-        st.error(f"Programming error: {prog_err}")
-        return None
+        version = pool.query("SELECT CURRENT_VERSION()")[0][0]
     except Exception as e:
-        st.error(f"Unexpected error: {str(e)}")
+        import snowflake.connector
+        if isinstance(e, snowflake.connector.errors.DatabaseError):
+            return None, None, f"Database error: {e}"
+        return None, None, f"Unexpected error: {str(e)}"
+    error = database_error(pool)
+    if error:
+        return None, version, error
+    return pool, version, None
+
+# Whether a [snowflake] section is configured in the Streamlit secrets
+def snowflake_configured():
+    try:
+        return "snowflake" in st.secrets
+    except Exception:
+        return False
+
+# Start connecting to Snowflake once per process, off the script thread. Returns
+# a future of connect_snowflake's result.
+@st.cache_resource(show_spinner=False)
+def start_connection():
+    try:
+        secrets = dict(st.secrets["snowflake"]) if snowflake_configured() else None
+    except Exception:
+        secrets = None
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rally-connect")
+    future = executor.submit(connect_snowflake, secrets)
+    executor.shutdown(wait=False)
+    return future
+
+# Local DuckDB database with the same schema and sample data (RALLY_LOCAL_DB sets the file, default in-memory)
+@st.cache_resource
+def init_local_connection():
+    return local_db.LocalPool(os.environ.get("RALLY_LOCAL_DB", ":memory:")).create_schema(sample_data=True)
+
+# Check that the BOOTCAMP_RALLY database exists (once, while connecting).
+# Returns an error message, or None if it is there.
+def database_error(_conn):
+    try:
+        if not _conn.query("SHOW DATABASES LIKE 'BOOTCAMP_RALLY'"):
+            return "BOOTCAMP_RALLY database not found! Please run the SQL scripts first."
         return None
+    except Exception as e:
+        return f"Cannot access BOOTCAMP_RALLY database: {e}. Running in demo mode."
 
 # Convert decimal values to float for calculations
 def convert_decimal_to_float(value):
@@ -95,23 +119,33 @@ def convert_decimal_to_float(value):
         return float(value)
     return value
 
-# Perform query with better error handling
-@st.cache_data(ttl=600)
-def run_query(query, _conn):
+# Perform query with better error handling. Cached results are tagged with the
+# tables they read and dropped as soon as a write touches one of those tables.
+def run_query(query, _conn, params=None, cached=True):
     try:
-        with _conn.cursor() as cur:
-            cur.execute(query)
-            return cur.fetchall()
+        if cached:
+            return _conn.cached_query(query, params)
+        return _conn.query(query, params)
     except Exception as e:
         st.error(f"Query failed: {str(e)}")
         return []
 
+# Like run_query, but returns a DataFrame built from the connector's columnar
+# result, with `columns` as its column names
+def run_frame_query(query, _conn, params=None, columns=None, cached=True):
+    try:
+        if cached:
+            return _conn.cached_query_frame(query, params, columns)
+        return _conn.query_frame(query, params, columns)
+    except Exception as e:
+        st.error(f"Query failed: {str(e)}")
+        return pd.DataFrame(columns=columns)
+
 # Execute query without returning results
-def execute_query(query, _conn):
+def execute_query(query, _conn, params=None):
     try:
-        with _conn.cursor() as cur:
-            cur.execute(query)
-            return True
+        _conn.execute(query, params)
+        return True
     except Exception as e:
         st.error(f"Query execution failed: {str(e)}")
         return False
@@ -121,226 +155,741 @@ def get_teams(_conn):
     query = "SELECT team_id, team_name FROM bootcamp_rally.teams.teams ORDER BY team_name"
     return run_query(query, _conn)
 
+CARS_QUERY = """
+SELECT c.car_id, t.team_name, c.model, c.speed, c.horsepower, c.handling, c.durability
+FROM bootcamp_rally.cars.cars c
+JOIN bootcamp_rally.teams.teams t ON c.team_id = t.team_id
+ORDER BY t.team_name, c.model
+"""
+
+TEAM_BUDGETS_QUERY = "SELECT team_id, team_name, budget FROM bootcamp_rally.teams.teams ORDER BY team_name"
+
+TEAM_BUDGET_COLUMNS = ["ID", "Team Name", "Budget ($)"]
+CAR_COLUMNS = ["ID", "Team", "Model", "Speed", "Horsepower", "Handling", "Durability"]
+RACE_COLUMNS = ["ID", "Race Name", "Length (km)", "Track Type", "Fee ($)", "Prize Pool ($)"]
+
+RACES_QUERY = "SELECT race_id, race_name, track_length_km, track_type, participation_fee, prize_pool FROM bootcamp_rally.races.races ORDER BY race_name"
+
 # Get cars with team names
 def get_cars(_conn):
-    query = """
-    SELECT c.car_id, t.team_name, c.model, c.speed, c.horsepower, c.handling, c.durability
-    FROM bootcamp_rally.cars.cars c
-    JOIN bootcamp_rally.teams.teams t ON c.team_id = t.team_id
-    ORDER BY t.team_name, c.model
-    """
-    return run_query(query, _conn)
+    return run_frame_query(CARS_QUERY, _conn, columns=CAR_COLUMNS)
 
 # Add new car
 def add_car(_conn, team_id, model, speed, horsepower, handling, durability):
-    query = f"""
+    query = """
     INSERT INTO bootcamp_rally.cars.cars (team_id, model, speed, horsepower, handling, durability)
-    VALUES ({team_id}, '{model}', {speed}, {horsepower}, {handling}, {durability})
+    VALUES (?, ?, ?, ?, ?, ?)
     """
-    success = execute_query(query, _conn)
+    success = execute_query(query, _conn, (team_id, model, speed, horsepower, handling, durability))
     if success:
         st.rerun()  # Refresh the page to show the new car
     return success
 
 # Add new team
 def add_team(_conn, team_name, budget):
-    query = f"""
+    query = """
     INSERT INTO bootcamp_rally.teams.teams (team_name, budget)
-    VALUES ('{team_name}', {budget})
+    VALUES (?, ?)
     """
-    success = execute_query(query, _conn)
+    success = execute_query(query, _conn, (team_name, budget))
     if success:
         st.rerun()  # Refresh the page to show the new team
     return success
 
+# Validate and bulk load an uploaded team or car file, showing what was loaded and
+# a per-row report of the rejected rows
+def render_bulk_import(_conn, kind):
+    with st.expander(f"📥 Bulk import {kind} from CSV or Parquet"):
+        if kind == "teams":
+            st.caption("Columns: team_name, budget (optional, defaults to $10,000)")
+        else:
+            st.caption("Columns: team_id or team_name, model, speed, horsepower, handling, durability")
+        uploaded = st.file_uploader(f"{kind.title()} file", type=["csv", "parquet"], key=f"import_{kind}")
+        if uploaded is None or not st.button(f"Import {kind}"):
+            return
+        try:
+            frame = bulk_import.read_table(uploaded)
+            import_file = bulk_import.import_teams if kind == "teams" else bulk_import.import_cars
+            loaded, errors = import_file(_conn, frame)
+        except Exception as e:
+            st.error(f"Import failed: {str(e)}")
+            return
+        if loaded:
+            st.success(f"Imported {loaded} of {len(frame)} {kind}.")
+        if not errors.empty:
+            st.warning(f"{errors['row'].nunique()} rows were rejected.")
+            st.dataframe(errors, hide_index=True)
+            st.download_button("Download error report", errors.to_csv(index=False), f"{kind}_import_errors.csv", "text/csv")
+
 # Get team budgets
 def get_team_budgets(_conn):
-    query = "SELECT team_id, team_name, budget FROM bootcamp_rally.teams.teams ORDER BY team_name"
-    return run_query(query, _conn)
+    return run_frame_query(TEAM_BUDGETS_QUERY, _conn, columns=TEAM_BUDGET_COLUMNS)
 
-# Update team budget
-def update_team_budget(_conn, team_id, new_budget):
-    query = f"""
-    UPDATE bootcamp_rally.teams.teams
-    SET budget = {new_budget}
-    WHERE team_id = {team_id}
-    """
-    return execute_query(query, _conn)
+# Reserve the next race id from the sequence, so the new race row never needs a read-back
+def next_race_id(_conn):
+    return _conn.next_id("bootcamp_rally.races.race_id_seq")
+
+RESULT_COLUMNS = ("race_id", "car_id", "team_id", "finish_time", "position", "prize_awarded")
+
+# Write the race row, its results, the budget settlement and the standings update in one transaction.
+# The settlement compare-and-swaps on the team versions read with the budgets; if a
+# team changed meanwhile, db.WriteConflict is raised and nothing is written.
+# Runs on a job worker thread, so errors are raised rather than shown.
+def record_race(_conn, race_row, results, budget_changes, versions):
+    race_id = race_row[0]
+    result_rows = [
+        (race_id, result['car_id'], result['team_id'], result['finish_time'], result['position'], result['prize'])
+        for result in results
+    ]
+    with _conn.transaction() as cur:
+        cur.execute("""
+        INSERT INTO bootcamp_rally.races.races (race_id, race_name, track_length_km, track_type, participation_fee, prize_pool, race_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, race_row)
+        _conn.bulk_insert(cur, "bootcamp_rally.races.race_results", RESULT_COLUMNS, result_rows)
+        settlement.settle(_conn, cur, budget_changes, versions)
+        for query, params in standings.delta_statements(results):
+            cur.execute(query, params)
 
 # Get available races
 def get_races(_conn):
-    query = "SELECT race_id, race_name, track_length_km, track_type, participation_fee, prize_pool FROM bootcamp_rally.races.races ORDER BY race_name"
-    return run_query(query, _conn)
+    return run_query(RACES_QUERY, _conn)
+
+# Fetch team budgets, cars and races for the dashboard concurrently, each on its
+# own pooled connection, so a cold load costs about as much as the slowest query
+def load_dashboard(_conn):
+    queries = [(TEAM_BUDGETS_QUERY, TEAM_BUDGET_COLUMNS), (CARS_QUERY, CAR_COLUMNS), (RACES_QUERY, RACE_COLUMNS)]
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        # Copy the context so the worker threads' queries count towards this page run
+        futures = [
+            executor.submit(contextvars.copy_context().run, _conn.cached_query_frame, query, None, columns)
+            for query, columns in queries
+        ]
+    data = []
+    for future, (_, columns) in zip(futures, queries):
+        try:
+            data.append(future.result())
+        except Exception as e:
+            st.error(f"Query failed: {str(e)}")
+            data.append(pd.DataFrame(columns=columns))
+    return data
+
+# Calendar races (races without results of their own)
+def get_calendar(_conn):
+    return run_query(season.CALENDAR_QUERY, _conn)
+
+# Run several races as one batched job
+def run_season(_conn, race_ids, seed=None, workers=None):
+    try:
+        return season.run_season(_conn, race_ids, seed=seed, workers=workers)
+    except Exception as e:
+        st.error(f"Season failed: {str(e)}")
+        return None
+
+# Championship standings, read straight from the maintained standings tables
+def get_team_standings(_conn):
+    return run_query(standings.TEAM_STANDINGS_QUERY, _conn)
+
+def get_car_standings(_conn):
+    return run_query(standings.CAR_STANDINGS_QUERY, _conn)
+
+# Recompute standings from the full race history, archived races included
+def rebuild_standings(_conn):
+    try:
+        standings.rebuild(_conn, archive.standings_deltas())
+        return True
+    except Exception as e:
+        st.error(f"Rebuilding standings failed: {str(e)}")
+        return False
+
+# Rows per page on the View Results page
+HISTORY_PAGE_SIZE = 50
+
+HISTORY_COLUMNS = ["Race", "Position", "Team", "Car Model", "Finish Time", "Prize ($)", "race_date", "race_id"]
+
+# Filters of a race history page as SQL conditions and parameters. `race` and
+# `result` prefix the race and race result columns.
+def history_conditions(after=None, race_name=None, team_id=None, track_type=None,
+                       date_from=None, date_to=None, race="r.", result="rr."):
+    conditions = []
+    params = []
+    if race_name:
+        conditions.append(f"{race}race_name = ?")
+        params.append(race_name)
+    if team_id:
+        conditions.append(f"{result}team_id = ?")
+        params.append(team_id)
+    if track_type:
+        conditions.append(f"{race}track_type = ?")
+        params.append(track_type)
+    if date_from:
+        conditions.append(f"{race}race_date >= ?")
+        params.append(datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        conditions.append(f"{race}race_date < ?")
+        params.append(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if after:
+        race_date, race_id, position = after
+        conditions.append(f"""({race}race_date < ?
+            OR ({race}race_date = ? AND {race}race_id < ?)
+            OR ({race}race_date = ? AND {race}race_id = ? AND {result}position > ?))""")
+        params.extend([race_date, race_date, race_id, race_date, race_id, position])
+    return conditions, params
+
+# Races of a history page, newest first. Pages are read races first so only the
+# results of the page's races are joined, however long the history is.
+HISTORY_RACES_QUERY = """
+SELECT r.race_id, r.race_date
+FROM bootcamp_rally.races.races r
+{where}
+ORDER BY r.race_date DESC, r.race_id DESC
+LIMIT ?
+"""
+
+HISTORY_QUERY = """
+SELECT r.race_name, rr.position, t.team_name, c.model,
+       CAST(rr.finish_time AS DOUBLE), CAST(rr.prize_awarded AS DOUBLE),
+       r.race_date, r.race_id
+FROM bootcamp_rally.races.race_results rr
+JOIN bootcamp_rally.races.races r ON rr.race_id = r.race_id
+JOIN bootcamp_rally.teams.teams t ON rr.team_id = t.team_id
+JOIN bootcamp_rally.cars.cars c ON rr.car_id = c.car_id
+{where}
+ORDER BY r.race_date DESC, r.race_id DESC, rr.position
+LIMIT ?
+"""
+
+# HISTORY_RACES_QUERY with its parameters: up to `limit` races matching the race
+# filters, from `start` (race_date, race_id) on, including the start race when
+# `inclusive`. With a team filter, only races the team has results in.
+def history_races_statement(limit, start=None, inclusive=True, race_name=None, team_id=None,
+                            track_type=None, date_from=None, date_to=None):
+    conditions, params = history_conditions(race_name=race_name, track_type=track_type,
+                                             date_from=date_from, date_to=date_to)
+    if start:
+        race_date, race_id = start
+        conditions.append(f"(r.race_date < ? OR (r.race_date = ? AND r.race_id {'<=' if inclusive else '<'} ?))")
+        params.extend([race_date, race_date, race_id])
+    if team_id:
+        conditions.append("""EXISTS (SELECT 1 FROM bootcamp_rally.races.race_results rr
+            WHERE rr.race_id = r.race_id AND rr.team_id = ?)""")
+        params.append(team_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return HISTORY_RACES_QUERY.format(where=where), params + [limit]
+
+# HISTORY_QUERY with its parameters: up to `limit` results of the given races,
+# after the `after` cursor's position in its race. The race ids filter both
+# tables so each is pruned to the page's races whichever side the join builds.
+def history_results_statement(race_ids, limit, after=None, team_id=None):
+    placeholders = ", ".join(["?"] * len(race_ids))
+    conditions = [f"rr.race_id IN ({placeholders})", f"r.race_id IN ({placeholders})"]
+    params = list(race_ids) * 2
+    if team_id:
+        conditions.append("rr.team_id = ?")
+        params.append(team_id)
+    if after:
+        conditions.append("(rr.race_id <> ? OR rr.position > ?)")
+        params.extend([after[1], after[2]])
+    return HISTORY_QUERY.format(where=f"WHERE {' AND '.join(conditions)}"), params + [limit]
+
+# One page of race history, newest first, over the hot tables and the Parquet
+# archive. `after` is the (race_date, race_id, position) of the last row on the
+# previous page; filters narrow the rows in each query.
+# Returns the page as a DataFrame and whether another page follows.
+def get_race_history(_conn, after=None, race_name=None, team_id=None, track_type=None,
+                     date_from=None, date_to=None, page_size=HISTORY_PAGE_SIZE):
+    filters = dict(after=after, race_name=race_name, team_id=team_id, track_type=track_type,
+                   date_from=date_from, date_to=date_to)
+    race_filters = dict(race_name=race_name, team_id=team_id, track_type=track_type,
+                        date_from=date_from, date_to=date_to)
+    # One extra row tells whether there is a next page. Every race read has a
+    # result left to show except possibly the cursor's, so page_size + 2 races
+    # are enough unless some have no results yet (calendar races); then the
+    # next races are read until the page is full or none are left.
+    start = after[:2] if after else None
+    inclusive = True
+    frames = []
+    rows = 0
+    while True:
+        query, params = history_races_statement(page_size + 2, start, inclusive, **race_filters)
+        races = run_query(query, _conn, tuple(params))
+        if races:
+            query, params = history_results_statement([race_id for race_id, _ in races], page_size + 1 - rows,
+                                                      after, team_id)
+            frame = run_frame_query(query, _conn, tuple(params), HISTORY_COLUMNS)
+            frames.append(frame)
+            rows += len(frame)
+        if rows > page_size or len(races) < page_size + 2:
+            break
+        start, inclusive = (races[-1][1], races[-1][0]), False
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=HISTORY_COLUMNS)
+    if archive.has_archive():
+        frame = pd.concat([frame, get_archived_history(_conn, filters, page_size + 1)], ignore_index=True)
+        frame = frame.sort_values(["race_date", "race_id", "Position"], ascending=[False, False, True], kind="stable")
+        frame = frame.iloc[:page_size + 1].reset_index(drop=True)
+    return frame.iloc[:page_size], len(frame) > page_size
+
+# Archived rows of a history page, with team and car names from the hot tables
+def get_archived_history(_conn, filters, limit):
+    conditions, params = history_conditions(**filters, race="", result="")
+    try:
+        frame = archive.history_page(conditions, params, limit)
+    except Exception as e:
+        st.error(f"Reading archived results failed: {str(e)}")
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    # Names of only the teams and cars on this page
+    team_ids = sorted({int(team_id) for team_id in frame["team_id"]})
+    car_ids = sorted({int(car_id) for car_id in frame["car_id"]})
+    team_names = dict(run_query(
+        f"SELECT team_id, team_name FROM bootcamp_rally.teams.teams WHERE team_id IN ({', '.join(['?'] * len(team_ids))})",
+        _conn, tuple(team_ids)
+    )) if team_ids else {}
+    models = dict(run_query(
+        f"SELECT car_id, model FROM bootcamp_rally.cars.cars WHERE car_id IN ({', '.join(['?'] * len(car_ids))})",
+        _conn, tuple(car_ids)
+    )) if car_ids else {}
+    frame["team_name"] = frame["team_id"].map(team_names).fillna("(deleted team)")
+    frame["model"] = frame["car_id"].map(models).fillna("(deleted car)")
+    frame = frame[["race_name", "position", "team_name", "model", "finish_time", "prize_awarded", "race_date", "race_id"]]
+    frame.columns = HISTORY_COLUMNS
+    return frame
+
+# Keyset cursor (race_date, race_id, position) of the last row of a history page
+def history_cursor(page):
+    last = page.iloc[-1]
+    return last["race_date"].to_pydatetime(), int(last["race_id"]), int(last["Position"])
+
+# Get all cars with their teams and current budgets, in a stable order, as a DataFrame
+def get_race_roster(_conn):
+    return run_frame_query(season.ROSTER_QUERY, _conn, columns=season.ROSTER_COLUMNS)
+
+# Check if teams can afford participation fee, charging each car of a team
+# against the team's remaining budget
+def select_participants(roster, fee):
+    return race_engine.select_participants(roster.itertuples(index=False, name=None), fee)
+
+# Forecast every selected race without touching the database. Cached on the
+# roster and race parameters, so re-rendering the page is free.
+@st.cache_data(show_spinner=False)
+def get_forecast(roster, races, n_sims, seed, workers):
+    grids = []
+    participants_per_race = []
+    for race in races:
+        participants = select_participants(roster, race[4])
+        participants_per_race.append(participants)
+        grids.append(race_engine.load_grid(participants))
+    
+    race_params = [
+        (grid, race[3], race[2], race[5]) if len(grid["speed"]) else None
+        for grid, race in zip(grids, races)
+    ]
+    forecasts = race_engine.forecast_races(
+        [params for params in race_params if params is not None], n_sims, seed=seed, workers=workers
+    )
+    forecasts = iter(forecasts)
+    
+    tables = []
+    for race, participants, params in zip(races, participants_per_race, race_params):
+        if params is None:
+            tables.append((race, None, None))
+            continue
+        forecast = next(forecasts)
+        summary = pd.DataFrame({
+            "Team": [car['team_name'] for car in participants],
+            "Car Model": [car['model'] for car in participants],
+            "Win (%)": forecast["win"] * 100,
+            "Podium (%)": forecast["podium"] * 100,
+            "Expected Position": forecast["expected_position"],
+            "Expected Prize ($)": forecast["expected_prize"],
+        }).sort_values("Expected Position")
+        positions = pd.DataFrame(
+            forecast["position_probabilities"] * 100,
+            columns=[f"P{i + 1}" for i in range(len(participants))],
+            index=[f"{car['team_name']} {car['model']}" for car in participants],
+        )
+        tables.append((race, summary.round(2), positions.round(2)))
+    return tables
+
+# Best car setup for a race within a stat budget, rated against the cars that
+# can currently afford to enter. Cached on the race, the field and the constraints.
+@st.cache_data(show_spinner=False)
+def get_setup_recommendation(race, roster, budget, bounds, seed):
+    race_id, race_name, track_length, track_type, fee, prize_pool = race
+    best = optimizer.optimize_setup(track_type, track_length, budget, dict(bounds))
+    if best is None:
+        return None, None, None
+    participants = select_participants(roster, fee)
+    rating = None
+    if participants:
+        rating = optimizer.rate_against_field(
+            best["setup"], race_engine.load_grid(participants), track_type, track_length, prize_pool, seed=seed
+        )
+    # The same budget on the other surfaces, for comparison
+    surfaces = []
+    for surface in ("Asphalt", "Snow", "Gravel"):
+        setup = optimizer.optimize_setup(surface, track_length, budget, dict(bounds))
+        surfaces.append({"Track Type": surface, **setup["setup"], "Expected Finish Time (s)": round(setup["expected_finish_time"], 2)})
+    return best, rating, pd.DataFrame(surfaces)
+
+# Stages of a race, in order, with the label shown while they run
+RACE_STAGES = [
+    ("load", "Loading participants"),
+    ("fees", "Charging participation fees"),
+    ("simulate", "Simulating race"),
+    ("budgets", "Working out budget changes"),
+    ("persist", "Recording results"),
+]
+
+# Run a race stage by stage (pass a seed to make the random factors reproducible).
+# With `sectors`, the race is simulated sector by sector with wear and retirements,
+# and the split times are saved under telemetry.TELEMETRY_DIR once it is recorded.
+# Yields (stage, payload) as each stage completes, or ("failed", message) on error,
+# and ("warning", message) for problems that do not stop the race. Races run on job
+# worker threads, which cannot show Streamlit messages, so every error is yielded.
+# The "simulate" payload is the leaderboard and the "persist" payload the final results.
+# Each stage's own duration is recorded as a "race_stage" event.
+def race_stages(_conn, race_id, seed=None, sectors=None):
+    stages = _race_stages(_conn, race_id, seed, sectors)
+    while True:
+        started = time.perf_counter()
+        try:
+            stage, payload = next(stages)
+        except StopIteration:
+            return
+        instrumentation.RECORDER.record("race_stage", stage, time.perf_counter() - started, race_id=race_id)
+        yield stage, payload
 
-# Simulate race
-def simulate_race(_conn, race_id):
+def _race_stages(_conn, race_id, seed=None, sectors=None):
     # Get race details
-    race_query = f"""
+    race_query = """
     SELECT race_name, track_length_km, track_type, participation_fee, prize_pool 
     FROM bootcamp_rally.races.races 
-    WHERE race_id = {race_id}
+    WHERE race_id = ?
     """
-    race_details = run_query(race_query, _conn)
+    try:
+        race_details = _conn.query(race_query, (race_id,))
+    except Exception as e:
+        yield "failed", f"Loading the race failed: {str(e)}"
+        return
     if not race_details:
-        return "Race not found!"
+        yield "failed", "Race not found!"
+        return
     
     # Convert decimal values to float
     race_details = [convert_decimal_to_float(val) for val in race_details[0]]
     race_name, track_length, track_type, fee, prize_pool = race_details
     
-    # Get all cars with their teams
-    cars_query = """
-    SELECT c.car_id, t.team_id, t.team_name, c.model, c.speed, c.horsepower, c.handling, c.durability, t.budget
-    FROM bootcamp_rally.cars.cars c
-    JOIN bootcamp_rally.teams.teams t ON c.team_id = t.team_id
-    """
-    all_cars = run_query(cars_query, _conn)
-    
-    # Check if teams can afford participation fee
-    participants = []
-    for car in all_cars:
-        # Convert decimal values to float
-        car = [convert_decimal_to_float(val) for val in car]
-        car_id, team_id, team_name, model, speed, hp, handling, durability, budget = car
-        
-        if budget >= fee:
-            participants.append({
-                'car_id': car_id,
-                'team_id': team_id,
-                'team_name': team_name,
-                'model': model,
-                'speed': speed,
-                'horsepower': hp,
-                'handling': handling,
-                'durability': durability,
-                'budget': budget
-            })
-            # Deduct participation fee
-            new_budget = budget - fee
-            update_team_budget(_conn, team_id, new_budget)
+    # Budgets decide who can pay the fee, so always read them fresh
+    try:
+        roster = _conn.query_frame(season.ROSTER_QUERY, columns=season.ROSTER_COLUMNS)
+    except Exception as e:
+        yield "failed", f"Loading participants failed: {str(e)}"
+        return
+    yield "load", roster
     
+    participants = select_participants(roster, fee)
     if not participants:
-        return "No teams can afford to participate in the race!"
+        yield "failed", "No teams can afford to participate in the race!"
+        return
+    yield "fees", participants
+    
+    # Simulate the whole grid in one vectorized pass, or sector by sector
+    grid = race_engine.load_grid(participants)
+    segments = None
+    if sectors:
+        segments = race_engine.simulate_segments(grid, track_type, track_length, sectors, seed=seed)
+        finish_times = segments["finish_times"]
+        order = race_engine.rank_segments(segments)
+    else:
+        finish_times = race_engine.score_grid(grid, track_type, track_length, seed=seed)
+        order = race_engine.rank_grid(finish_times)
     
-    # Simulate race for each participant
     results = []
-    for car in participants:
-        # Base performance based on car characteristics
-        base_performance = (
-            car['speed'] * 0.3 +
-            car['horsepower'] * 0.2 +
-            car['handling'] * 0.3 +
-            car['durability'] * 0.2
-        )
-        
-        # Adjust for track type
-        track_factor = 1.0
-        if track_type == 'Snow':
-            track_factor = car['handling'] / 100
-        elif track_type == 'Gravel':
-            track_factor = car['durability'] / 100
-        
-        # Random factor (0.8 to 1.2)
-        random_factor = random.uniform(0.8, 1.2)
-        
-        # Calculate finish time (lower is better)
-        finish_time = (track_length * 1000) / float(base_performance * track_factor * random_factor)
-        
-        results.append({
+    for i in order:
+        car = participants[i]
+        result = {
             'car_id': car['car_id'],
             'team_id': car['team_id'],
             'team_name': car['team_name'],
             'model': car['model'],
-            'finish_time': finish_time,
-            'budget': car['budget'] - fee  # Updated after fee deduction
-        })
+            # Retired cars have no finish time
+            'finish_time': float(finish_times[i]) if np.isfinite(finish_times[i]) else None
+        }
+        if segments is not None:
+            result['dnf_sector'] = int(segments["dnf_sector"][i])
+        results.append(result)
     
-    # Sort by finish time (ascending)
-    results.sort(key=lambda x: x['finish_time'])
-    
-    # Assign positions and prizes
-    prize_distribution = [0.4, 0.3, 0.2, 0.1]  # Top 4 get prizes
+    # Assign positions and prizes; only finishers are paid
+    prize_distribution = race_engine.PRIZE_DISTRIBUTION  # Top 4 get prizes
     for i, result in enumerate(results):
         result['position'] = i + 1
-        if i < len(prize_distribution):
-            prize = prize_pool * prize_distribution[i]
-            result['prize'] = prize
-            # Update team budget with prize money
-            new_budget = result['budget'] + prize
-            update_team_budget(_conn, result['team_id'], new_budget)
+        if i < len(prize_distribution) and result['finish_time'] is not None:
+            result['prize'] = prize_pool * prize_distribution[i]
         else:
             result['prize'] = 0
+    yield "simulate", results
+    
+    # Net fees and prize money per team, settled together with the results
+    budget_changes = race_engine.budget_changes(
+        [car['team_id'] for car in participants],
+        [(result['team_id'], result['prize']) for result in results if result['prize']],
+        fee
+    )
+    versions = dict(zip(roster["team_id"].tolist(), roster["version"].tolist()))
+    yield "budgets", budget_changes
     
     # Record race results
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    execute_query(f"INSERT INTO bootcamp_rally.races.races (race_name, track_length_km, track_type, participation_fee, prize_pool, race_date) VALUES ('{race_name}', {track_length}, '{track_type}', {fee}, {prize_pool}, '{current_time}')", _conn)
+    try:
+        new_race_id = next_race_id(_conn)
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        race_row = (new_race_id, race_name, track_length, track_type, fee, prize_pool, current_time)
+        record_race(_conn, race_row, results, budget_changes, versions)
+    except db.WriteConflict:
+        raise
+    except Exception as e:
+        yield "failed", f"Failed to record the race: {str(e)}. Team budgets were not changed."
+        return
+    if segments is not None:
+        try:
+            telemetry.save(telemetry.race_path(new_race_id), [car['car_id'] for car in participants], segments)
+        except OSError as e:
+            yield "warning", f"Race recorded, but saving sector telemetry failed: {str(e)}"
+    yield "persist", results
+
+# Simulate race, returning the results or an error message. on_stage(stage, payload)
+# sees every stage. If another race changed a team's budget before this one was
+# recorded, the race is run again from the fresh budgets.
+def simulate_race(_conn, race_id, seed=None, sectors=None, on_stage=None):
+    for attempt in range(settlement.MAX_ATTEMPTS):
+        try:
+            for stage, payload in race_stages(_conn, race_id, seed, sectors):
+                if on_stage:
+                    on_stage(stage, payload)
+                if stage in ("failed", "persist"):
+                    return payload
+        except db.WriteConflict:
+            continue
+    return "Team budgets kept changing while the race was being recorded. Please try again."
+
+# Background worker shared by every session, so races run outside the script thread
+@st.cache_resource
+def get_job_queue():
+    return jobs.JobQueue(workers=2)
+
+# Race job body: run the race, reporting each stage (and the provisional leaderboard) on the job
+def run_race_job(job, _conn, race_id, sectors=None):
+    stage_names = [name for name, _ in RACE_STAGES]
     
-    # Get the last inserted race_id
-    race_id_query = "SELECT MAX(race_id) FROM bootcamp_rally.races.races"
-    new_race_id_result = run_query(race_id_query, _conn)
-    if new_race_id_result:
-        new_race_id = convert_decimal_to_float(new_race_id_result[0][0])
-    else:
-        new_race_id = 1
+    def report(stage, payload):
+        if stage == "warning":
+            job.warnings.append(payload)
+        elif stage in stage_names:
+            job.update(stage, (stage_names.index(stage) + 1) / len(stage_names), payload if stage == "simulate" else None)
+    
+    return simulate_race(_conn, race_id, sectors=sectors, on_stage=report)
+
+# Poll the active race job every second without rerunning the whole page
+# (Streamlit versions without fragments show a refresh button instead)
+def _poll_every(seconds):
+    if hasattr(st, "fragment"):
+        return st.fragment(run_every=seconds)
+    return lambda fn: fn
+
+@_poll_every(1.0)
+def render_race_job():
+    active = st.session_state.get("race_job")
+    job = get_job_queue().get(active["key"]) if active else None
+    if job is None:
+        return
+    if job.finished:
+        # Show the outcome on a full rerun and free the key for the next race
+        st.session_state.race_job = None
+        st.session_state.finished_race_job = active
+        st.session_state.pop("race_request_key", None)
+        st.rerun()
+    
+    stage_names = [name for name, _ in RACE_STAGES]
+    done = stage_names.index(job.stage) + 1 if job.stage else 0
+    next_label = RACE_STAGES[done][1] if done < len(RACE_STAGES) else "Done"
+    status = "Queued" if job.status == jobs.QUEUED else next_label
+    st.progress(job.progress, text=f"{job.description}: {status}")
+    if job.detail is not None:
+        st.caption("Provisional leaderboard")
+        st.dataframe(results_table(job.detail), hide_index=True)
+    if not hasattr(st, "fragment"):
+        st.button("🔄 Refresh")
+
+# Results of a finished race job, with its stage timings and the podium
+def render_race_results(job, request_id):
+    if job.status == jobs.FAILED:
+        st.error(f"Race failed: {job.error}")
+        return
+    results = job.result
+    if isinstance(results, str):
+        st.error(results)
+        return
+    for warning in job.warnings:
+        st.warning(warning)
+    stage_labels = dict(RACE_STAGES)
+    st.success(f"{job.description} completed! 🏁")
+    
+    # Display results
+    st.subheader("📊 Race Results")
+    st.dataframe(results_table(results), hide_index=True)
+    
+    with st.expander("⏱️ Stage timings"):
+        stage_times = [
+            {"Stage": stage_labels[event["name"]], "Time (ms)": event["ms"]}
+            for event in instrumentation.RECORDER.events(request_id)
+            if event["kind"] == "race_stage"
+        ]
+        st.dataframe(pd.DataFrame(stage_times), hide_index=True)
     
-    # Insert results
-    for result in results:
-        execute_query(f"""
-        INSERT INTO bootcamp_rally.races.race_results (race_id, car_id, team_id, finish_time, position, prize_awarded)
-        VALUES ({new_race_id}, {result['car_id']}, {result['team_id']}, {result['finish_time']}, {result['position']}, {result['prize']})
-        """, _conn)
+    # Show podium
+    st.subheader("🏆 Podium")
+    cols = st.columns(3)
+    if len(results) > 1:
+        with cols[0]:
+            st.subheader("2nd 🥈")
+            st.write(f"{results[1]['team_name']}")
+            st.write(f"{results[1]['model']}")
+    if len(results) > 0:
+        with cols[1]:
+            st.subheader("1st 🥇")
+            st.write(f"{results[0]['team_name']}")
+            st.write(f"{results[0]['model']}")
+    if len(results) > 2:
+        with cols[2]:
+            st.subheader("3rd 🥉")
+            st.write(f"{results[2]['team_name']}")
+            st.write(f"{results[2]['model']}")
+
+# Format race results for display
+def results_table(results):
+    results_df = pd.DataFrame(results)
+    columns = ['position', 'team_name', 'model', 'finish_time', 'prize']
+    labels = ['Position', 'Team', 'Car Model', 'Finish Time (s)', 'Prize ($)']
+    if 'dnf_sector' in results_df:
+        results_df['status'] = [
+            f"DNF (sector {sector + 1})" if sector >= 0 else "Finished" for sector in results_df['dnf_sector']
+        ]
+        columns.append('status')
+        labels.append('Status')
+    results_df = results_df[columns]
+    results_df['finish_time'] = results_df['finish_time'].astype(float).round(2)
+    results_df['prize'] = results_df['prize'].round(2)
+    results_df.columns = labels
+    return results_df
+
+# Optional sidebar panel with the queries and timings recorded for this page run
+def render_debug_panel(request):
+    if not st.sidebar.checkbox("🐞 Debug panel"):
+        return
     
-    return results
+    with st.sidebar:
+        scope = st.radio("Events", ["This page run", "All recent"], horizontal=True)
+        events = instrumentation.RECORDER.events(request["id"] if scope == "This page run" else None)
+        queries = [event for event in events if event["kind"] == "query"]
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Queries", len(queries))
+        col2.metric("DB time (ms)", round(sum(event["ms"] for event in queries if event.get("cache") != "hit"), 1))
+        col3.metric("Cache hits", sum(1 for event in queries if event.get("cache") == "hit"))
+        paints = [event for event in events if event["kind"] == "first_paint"]
+        if paints:
+            st.metric(
+                "First paint (ms)", paints[-1]["ms"],
+                delta=f"budget {FIRST_PAINT_BUDGET_S * 1000:.0f} ms", delta_color="inverse" if paints[-1]["over_budget"] else "off"
+            )
+        
+        if events:
+            events_df = pd.DataFrame(events)
+            columns = [column for column in ["kind", "name", "ms", "rows", "cache", "sfqid", "page", "sql"] if column in events_df]
+            st.dataframe(events_df[columns], hide_index=True)
+        
+        st.download_button("Export JSON lines", instrumentation.RECORDER.to_jsonl(events), file_name="rally_events.jsonl")
+        st.download_button("Export Prometheus text", instrumentation.RECORDER.to_prometheus(events), file_name="rally_metrics.prom")
+
+# Process-wide marker of whether the first script run has painted yet
+@st.cache_resource
+def _cold_start():
+    return {"pending": True}
+
+# Record how long the navigation shell took to appear: from process start on the
+# first run after a cold start, from the start of the script run otherwise
+def record_first_paint(page, render_started):
+    cold_start = _cold_start()
+    cold = cold_start["pending"]
+    cold_start["pending"] = False
+    started = instrumentation.PROCESS_STARTED if cold else render_started
+    seconds = time.perf_counter() - started
+    instrumentation.RECORDER.record(
+        "first_paint", page, seconds, cold=cold, over_budget=seconds > FIRST_PAINT_BUDGET_S
+    )
 
 # Streamlit app
 def main():
+    # Everything recorded during this script run is tagged with one request id
+    request = instrumentation.RECORDER.begin_request()
+    render_started = time.perf_counter()
+    
+    # Connect in the background while the shell renders
+    configured = SNOWFLAKE_AVAILABLE and snowflake_configured()
+    connection = start_connection() if configured else None
+    
     st.set_page_config(page_title="Rally Racing Management", page_icon="🏎️", layout="wide")
     st.title("🏎️ Bootcamp Rally Racing Management")
     
-    # Check if Snowflake connector is available
-    if not SNOWFLAKE_AVAILABLE:
-        st.warning("Snowflake connector not available. Running in demo mode.")
-        demo_mode = True
-        conn = None
-        teams, cars, races = get_demo_data()
+    # Sidebar navigation
+    page = st.sidebar.selectbox("Navigation", ["Dashboard", "Manage Teams", "Manage Cars", "Run Race", "Season", "Forecast", "Optimizer", "Standings", "View Results"])
+    instrumentation.RECORDER.set_page(page)
+    record_first_paint(page, render_started)
+    
+    # Without Snowflake configured, every page can still run against a local DuckDB
+    # copy of the schema. A configured Snowflake that fails is an error, never a
+    # silent switch to a throwaway local database.
+    if not configured:
+        if DUCKDB_AVAILABLE:
+            conn = init_local_connection()
+            demo_mode = False
+            st.sidebar.info("💾 Snowflake is not configured. Using a local DuckDB database with sample data.")
+        else:
+            if not SNOWFLAKE_AVAILABLE:
+                st.warning("Snowflake connector not available. Running in demo mode.")
+            else:
+                st.error("Snowflake credentials not found in secrets!")
+            demo_mode = True
+            conn = None
+            teams, cars, races = get_demo_data()
     else:
-        # Initialize connection
-        conn = init_connection()
+        if not connection.done():
+            with st.spinner("Connecting to Snowflake..."):
+                connection.result()
+        conn, version, error = connection.result()
         demo_mode = conn is None
         
         if demo_mode:
+            st.error(error)
             teams, cars, races = get_demo_data()
+            # Try connecting again on the next run instead of keeping the failure for the process
+            start_connection.clear()
         else:
-            # Test if we can access the database
-            try:
-                test_query = "SHOW DATABASES LIKE 'BOOTCAMP_RALLY'"
-                result = run_query(test_query, conn)
-                if not result:
-                    st.error("BOOTCAMP_RALLY database not found! Please run the SQL scripts first.")
-                    demo_mode = True
-                    teams, cars, races = get_demo_data()
-            except Exception as e:
-                st.error(f"Cannot access BOOTCAMP_RALLY database: {e}. Running in demo mode.")
-                demo_mode = True
-                teams, cars, races = get_demo_data()
-    
-    # Sidebar navigation
-    page = st.sidebar.selectbox("Navigation", ["Dashboard", "Manage Teams", "Manage Cars", "Run Race", "View Results"])
+            st.sidebar.success(f"✅ Connected to Snowflake v{version}")
 
     if page == "Dashboard":
         st.header("🏁 Rally Racing Dashboard")
         
+        if not demo_mode:
+            teams_data, cars_data, races_data = load_dashboard(conn)
+        
         # Display teams and budgets
         st.subheader("🏆 Teams & Budgets")
         if demo_mode:
             team_df = pd.DataFrame(teams, columns=["ID", "Team Name", "Budget ($)"])
         else:
-            teams_data = get_team_budgets(conn) if conn else []
-            if teams_data:
-                team_df = pd.DataFrame(teams_data, columns=["ID", "Team Name", "Budget ($)"])
-            else:
+            team_df = teams_data
+            if team_df.empty:
                 st.info("No teams found in the database.")
-                team_df = pd.DataFrame()
         
         if not team_df.empty:
             st.dataframe(team_df, hide_index=True)
@@ -350,12 +899,9 @@ def main():
         if demo_mode:
             car_df = pd.DataFrame(cars, columns=["ID", "Team", "Model", "Speed", "Horsepower", "Handling", "Durability"])
         else:
-            cars_data = get_cars(conn) if conn else []
-            if cars_data:
-                car_df = pd.DataFrame(cars_data, columns=["ID", "Team", "Model", "Speed", "Horsepower", "Handling", "Durability"])
-            else:
+            car_df = cars_data
+            if car_df.empty:
                 st.info("No cars found in the database.")
-                car_df = pd.DataFrame()
         
         if not car_df.empty:
             st.dataframe(car_df, hide_index=True)
@@ -365,12 +911,9 @@ def main():
         if demo_mode:
             race_df = pd.DataFrame(races, columns=["ID", "Race Name", "Length (km)", "Track Type", "Fee ($)", "Prize Pool ($)"])
         else:
-            races_data = get_races(conn) if conn else []
-            if races_data:
-                race_df = pd.DataFrame(races_data, columns=["ID", "Race Name", "Length (km)", "Track Type", "Fee ($)", "Prize Pool ($)"])
-            else:
+            race_df = races_data
+            if race_df.empty:
                 st.info("No races found in the database.")
-                race_df = pd.DataFrame()
         
         if not race_df.empty:
             st.dataframe(race_df, hide_index=True)
@@ -397,11 +940,12 @@ def main():
                     else:
                         st.error("Please enter a team name.")
             
+            render_bulk_import(conn, "teams")
+            
             # Display current teams
             st.subheader("📋 Current Teams")
-            teams_data = get_team_budgets(conn) if conn else []
-            if teams_data:
-                team_df = pd.DataFrame(teams_data, columns=["ID", "Team Name", "Budget ($)"])
+            team_df = get_team_budgets(conn)
+            if not team_df.empty:
                 st.dataframe(team_df, hide_index=True)
             else:
                 st.info("No teams found in the database.")
@@ -427,11 +971,11 @@ def main():
                     model = st.text_input("Car Model")
                     col1, col2 = st.columns(2)
                     with col1:
-                        speed = st.slider("Speed", 1, 500, 300)
-                        horsepower = st.slider("Horsepower", 1, 2000, 800)
+                        speed = st.slider("Speed", *race_engine.STAT_BOUNDS["speed"], 300)
+                        horsepower = st.slider("Horsepower", *race_engine.STAT_BOUNDS["horsepower"], 800)
                     with col2:
-                        handling = st.slider("Handling", 1, 100, 75)
-                        durability = st.slider("Durability", 1, 100, 80)
+                        handling = st.slider("Handling", *race_engine.STAT_BOUNDS["handling"], 75)
+                        durability = st.slider("Durability", *race_engine.STAT_BOUNDS["durability"], 80)
                     
                     submitted = st.form_submit_button("Add Car")
                     
@@ -445,11 +989,12 @@ def main():
                         else:
                             st.error("Please enter a car model.")
             
+            render_bulk_import(conn, "cars")
+            
             # Display current cars
             st.subheader("📋 Current Cars")
-            cars_data = get_cars(conn) if conn else []
-            if cars_data:
-                car_df = pd.DataFrame(cars_data, columns=["ID", "Team", "Model", "Speed", "Horsepower", "Handling", "Durability"])
+            car_df = get_cars(conn)
+            if not car_df.empty:
                 st.dataframe(car_df, hide_index=True)
             else:
                 st.info("No cars found in the database.")
@@ -467,54 +1012,190 @@ def main():
             else:
                 race_options = {f"{race_id} - {name}": race_id for race_id, name, length, track_type, fee, prize in races_data}
                 selected_race = st.selectbox("Select Race", options=list(race_options.keys()))
+                col1, col2 = st.columns(2)
+                with col1:
+                    by_sector = st.checkbox("Simulate sector by sector (wear, retirements, split times)")
+                with col2:
+                    sectors = st.number_input("Sectors", min_value=1, max_value=1000, value=100, step=10, disabled=not by_sector)
                 
-                if st.button("Start Race! 🏎️💨"):
+                # Races run on the background job queue. The idempotency key stays the same
+                # until the job finishes, so a double click or rerun cannot start it twice.
+                if st.button("Start Race! 🏎️💨", disabled=bool(st.session_state.get("race_job"))):
                     race_id = race_options[selected_race]
+                    key = st.session_state.setdefault("race_request_key", f"race-{uuid.uuid4().hex}")
+                    get_job_queue().submit(
+                        key, run_race_job, conn, race_id, int(sectors) if by_sector else None,
+                        description=selected_race.split(" - ", 1)[1]
+                    )
+                    st.session_state.race_job = {"key": key, "request_id": request["id"]}
+                    st.session_state.finished_race_job = None
+                
+                if st.session_state.get("race_job"):
+                    render_race_job()
+                finished = st.session_state.get("finished_race_job")
+                job = get_job_queue().get(finished["key"]) if finished else None
+                if job is not None:
+                    render_race_results(job, finished["request_id"])
+
+    elif page == "Season":
+        st.header("📆 Run Season")
+        
+        if demo_mode:
+            st.warning("This feature is not available in demo mode. Connect to Snowflake to run a season.")
+        else:
+            calendar = get_calendar(conn) if conn else []
+            if not calendar:
+                st.warning("No calendar races available. Please add races to the database.")
+            else:
+                race_options = {f"{race[0]} - {race[1]}": race[0] for race in calendar}
+                selected_races = st.multiselect("Races (run in this order)", options=list(race_options.keys()), default=list(race_options.keys()))
+                col1, col2 = st.columns(2)
+                with col1:
+                    seed = st.number_input("Seed (0 = random)", min_value=0, value=0, step=1)
+                with col2:
+                    use_pool = st.checkbox("Score races across processes", value=len(selected_races) > 4)
+                
+                if selected_races and st.button("Start Season! 🏁"):
+                    with st.spinner(f"Running {len(selected_races)} races..."):
+                        season_results = run_season(
+                            conn, [race_options[name] for name in selected_races],
+                            seed=int(seed) or None, workers=None if use_pool else 1
+                        )
                     
-                    # Show loading animation
-                    with st.spinner("Race in progress..."):
-                        # Simulate race with progress bar
-                        progress_bar = st.progress(0)
-                        for percent_complete in range(100):
-                            time.sleep(0.02)  # Simulate race progress
-                            progress_bar.progress(percent_complete + 1)
+                    if season_results is not None:
+                        st.success("Season completed! 🏁")
+                        summary = []
+                        for race, results in season_results:
+                            winner = results[0] if results else None
+                            summary.append({
+                                "Race": race[1],
+                                "Track Type": race[3],
+                                "Entrants": len(results),
+                                "Winner": f"{winner['team_name']} {winner['model']}" if winner else "No entrants",
+                                "Winning Time (s)": round(winner['finish_time'], 2) if winner else None,
+                            })
+                        st.dataframe(pd.DataFrame(summary), hide_index=True)
                         
-                        # Get race results
-                        results = simulate_race(conn, race_id)
+                        for race, results in season_results:
+                            if results:
+                                with st.expander(f"📊 {race[1]}"):
+                                    st.dataframe(results_table(results), hide_index=True)
+
+    elif page == "Forecast":
+        st.header("🔮 Race Forecast")
+        
+        if demo_mode:
+            st.warning("This feature is not available in demo mode. Connect to Snowflake to forecast races.")
+        else:
+            races_data = get_races(conn) if conn else []
+            if not races_data:
+                st.warning("No races available. Please add races to the database.")
+            else:
+                race_options = {f"{race[0]} - {race[1]}": race for race in races_data}
+                selected_races = st.multiselect("Races", options=list(race_options.keys()), default=list(race_options.keys()))
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    n_sims = st.select_slider("Simulations per race", options=[10_000, 50_000, 100_000, 250_000, 500_000], value=100_000)
+                with col2:
+                    seed = st.number_input("Seed", min_value=0, value=42, step=1)
+                with col3:
+                    use_pool = st.checkbox("Spread races across processes", value=len(selected_races) > 1)
+                
+                if selected_races and st.button("Run Forecast 🔮"):
+                    # Budgets as currently known; the forecast itself never writes
+                    roster = get_race_roster(conn)
+                    races = tuple(tuple(convert_decimal_to_float(val) for val in race_options[name]) for name in selected_races)
+                    workers = None if use_pool else 1
+                    with st.spinner(f"Simulating {n_sims:,} races each..."):
+                        forecasts = get_forecast(roster, races, n_sims, int(seed), workers)
                     
-                    if isinstance(results, str):
-                        st.error(results)
+                    for race, summary, positions in forecasts:
+                        st.subheader(f"🏁 {race[1]} ({race[3]}, {race[2]:g} km)")
+                        if summary is None:
+                            st.info("No teams can afford to participate in this race.")
+                            continue
+                        st.dataframe(summary, hide_index=True)
+                        with st.expander("Finishing position distribution (%)"):
+                            st.dataframe(positions)
+
+    elif page == "Optimizer":
+        st.header("🔧 Car Setup Optimizer")
+        
+        if demo_mode:
+            st.warning("This feature is not available in demo mode. Connect to Snowflake to optimize setups.")
+        else:
+            races_data = get_races(conn) if conn else []
+            if not races_data:
+                st.warning("No races available. Please add races to the database.")
+            else:
+                race_options = {f"{race[0]} - {race[1]}": race for race in races_data}
+                selected_race = st.selectbox("Race", options=list(race_options.keys()))
+                budget_share = st.slider(
+                    "Stat budget (% of a fully maxed car)", min_value=5, max_value=100, value=50, step=5,
+                    help="Each stat costs the share of its slider range it uses; a maxed car costs 100%."
+                )
+                st.caption("Limit individual stats (slider bounds from Manage Cars)")
+                cols = st.columns(len(race_engine.STAT_COLUMNS))
+                bounds = []
+                for col, column in zip(cols, race_engine.STAT_COLUMNS):
+                    with col:
+                        low, high = race_engine.STAT_BOUNDS[column]
+                        bounds.append((column, st.slider(column.title(), low, high, (low, high))))
+                
+                if st.button("Find Best Setup 🔧"):
+                    race = tuple(convert_decimal_to_float(val) for val in race_options[selected_race])
+                    with st.spinner("Searching setups..."):
+                        best, rating, surfaces = get_setup_recommendation(
+                            race, get_race_roster(conn), budget_share / 100 * len(race_engine.STAT_COLUMNS), tuple(bounds), 42
+                        )
+                    if best is None:
+                        st.error("No setup fits this budget within the stat limits.")
                     else:
-                        st.success("Race completed! 🏁")
-                        
-                        # Display results
-                        st.subheader("📊 Race Results")
-                        results_df = pd.DataFrame(results)
-                        results_df = results_df[['position', 'team_name', 'model', 'finish_time', 'prize']]
-                        results_df['finish_time'] = results_df['finish_time'].round(2)
-                        results_df['prize'] = results_df['prize'].round(2)
-                        results_df.columns = ['Position', 'Team', 'Car Model', 'Finish Time (s)', 'Prize ($)']
-                        
-                        st.dataframe(results_df, hide_index=True)
-                        
-                        # Show podium
-                        st.subheader("🏆 Podium")
-                        cols = st.columns(3)
-                        if len(results) > 0:
-                            with cols[0]:
-                                st.subheader("2nd 🥈")
-                                st.write(f"{results[1]['team_name']}")
-                                st.write(f"{results[1]['model']}")
-                        if len(results) > 0:
-                            with cols[1]:
-                                st.subheader("1st 🥇")
-                                st.write(f"{results[0]['team_name']}")
-                                st.write(f"{results[0]['model']}")
-                        if len(results) > 2:
-                            with cols[2]:
-                                st.subheader("3rd 🥉")
-                                st.write(f"{results[2]['team_name']}")
-                                st.write(f"{results[2]['model']}")
+                        st.subheader(f"🏁 Best setup for {race[1]} ({race[3]}, {race[2]:g} km)")
+                        cols = st.columns(len(race_engine.STAT_COLUMNS) + 1)
+                        for col, column in zip(cols, race_engine.STAT_COLUMNS):
+                            col.metric(column.title(), best["setup"][column])
+                        cols[-1].metric("Expected Finish Time (s)", f"{best['expected_finish_time']:.2f}")
+                        st.caption(f"{best['evaluations']:,} setups evaluated, using {best['cost'] / len(race_engine.STAT_COLUMNS):.0%} of a maxed car.")
+                        if rating is None:
+                            st.info("No team can currently afford this race, so there is no field to compare against.")
+                        else:
+                            st.write(
+                                f"Against the {rating['field_size'] - 1} cars that can enter now: "
+                                f"**{rating['win']:.1%}** win, **{rating['podium']:.1%}** podium, "
+                                f"expected position **{rating['expected_position']:.2f}**, "
+                                f"expected prize **${rating['expected_prize']:,.2f}**."
+                            )
+                        with st.expander("Best setup for each track type with the same budget"):
+                            st.dataframe(surfaces, hide_index=True)
+
+    elif page == "Standings":
+        st.header("🏆 Championship Standings")
+        
+        if demo_mode:
+            st.warning("This feature is not available in demo mode. Connect to Snowflake to view standings.")
+        else:
+            team_tab, car_tab = st.tabs(["Teams", "Cars"])
+            with team_tab:
+                team_standings = get_team_standings(conn) if conn else []
+                if team_standings:
+                    standings_df = pd.DataFrame(team_standings, columns=["Team", "Points", "Wins", "Podiums", "Entries", "Prize Money ($)", "Avg Finish Time (s)"])
+                    standings_df["Avg Finish Time (s)"] = standings_df["Avg Finish Time (s)"].round(2)
+                    st.dataframe(standings_df, hide_index=True)
+                else:
+                    st.info("No standings yet. Run a race first!")
+            with car_tab:
+                car_standings = get_car_standings(conn) if conn else []
+                if car_standings:
+                    standings_df = pd.DataFrame(car_standings, columns=["Team", "Car Model", "Points", "Wins", "Podiums", "Entries", "Prize Money ($)", "Avg Finish Time (s)"])
+                    standings_df["Avg Finish Time (s)"] = standings_df["Avg Finish Time (s)"].round(2)
+                    st.dataframe(standings_df, hide_index=True)
+                else:
+                    st.info("No standings yet. Run a race first!")
+            
+            if st.button("🔧 Rebuild from race history"):
+                if rebuild_standings(conn):
+                    st.rerun()
 
     elif page == "View Results":
         st.header("📋 Race Results History")
@@ -522,24 +1203,64 @@ def main():
         if demo_mode:
             st.warning("This feature is not available in demo mode. Connect to Snowflake to view results.")
         else:
-            # Get all past race results
-            query = """
-            SELECT r.race_name, rr.position, t.team_name, c.model, rr.finish_time, rr.prize_awarded
-            FROM bootcamp_rally.races.race_results rr
-            JOIN bootcamp_rally.races.races r ON rr.race_id = r.race_id
-            JOIN bootcamp_rally.teams.teams t ON rr.team_id = t.team_id
-            JOIN bootcamp_rally.cars.cars c ON rr.car_id = c.car_id
-            ORDER BY r.race_date DESC, rr.position
-            """
+            # Filters are applied in the query, so only one page is ever fetched
+            races_data = get_races(conn) if conn else []
+            teams_data = get_teams(conn) if conn else []
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                race_names = {race[1] for race in races_data} | set(archive.race_names())
+                race_name = st.selectbox("Race", ["All"] + sorted(race_names))
+            with col2:
+                team_options = {"All": None}
+                team_options.update({name: team_id for team_id, name in teams_data})
+                team_name = st.selectbox("Team", list(team_options.keys()))
+            with col3:
+                track_type = st.selectbox("Track Type", ["All", "Asphalt", "Snow", "Gravel"])
+            with col4:
+                date_range = st.date_input("Date Range", value=())
+            
+            filters = {
+                "race_name": None if race_name == "All" else race_name,
+                "team_id": team_options[team_name],
+                "track_type": None if track_type == "All" else track_type,
+                "date_from": date_range[0] if len(date_range) > 0 else None,
+                "date_to": date_range[1] if len(date_range) > 1 else None,
+            }
+            
+            # Keyset cursors of the pages visited so far; reset when the filters change
+            if st.session_state.get("history_filters") != filters:
+                st.session_state.history_filters = filters
+                st.session_state.history_cursors = [None]
+            cursors = st.session_state.history_cursors
             
-            results = run_query(query, conn) if conn else []
+            results, has_next = get_race_history(conn, cursors[-1], **filters)
             
-            if results:
-                results_df = pd.DataFrame(results, columns=["Race", "Position", "Team", "Car Model", "Finish Time", "Prize ($)"])
-                results_df['Finish Time'] = results_df['Finish Time'].apply(convert_decimal_to_float).round(2)
+            if not results.empty:
+                results_df = results[HISTORY_COLUMNS[:6]].copy()
+                results_df['Finish Time'] = results_df['Finish Time'].round(2)
                 st.dataframe(results_df, hide_index=True)
+                
+                col1, col2, col3 = st.columns([1, 1, 4])
+                with col1:
+                    if st.button("⬅️ Newer", disabled=len(cursors) == 1):
+                        cursors.pop()
+                        st.rerun()
+                with col2:
+                    if st.button("Older ➡️", disabled=not has_next):
+                        cursors.append(history_cursor(results))
+                        st.rerun()
+                with col3:
+                    st.caption(f"Page {len(cursors)}")
+            elif len(cursors) > 1:
+                cursors.pop()
+                st.rerun()
+            elif any(filters.values()):
+                st.info("No race results match these filters.")
             else:
                 st.info("No race results available yet. Run a race first!")
+    
+    instrumentation.RECORDER.record("page", page, time.perf_counter() - render_started)
+    render_debug_panel(request)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
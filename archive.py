@@ -0,0 +1,241 @@
+import glob
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import race_engine
+
+# Where archived race results are kept, one Parquet file per season and track type
+ARCHIVE_DIR = os.environ.get("RALLY_ARCHIVE_DIR", "archive")
+
+# Races older than this many days are archived by default
+DEFAULT_HORIZON_DAYS = 365
+
+# Archived columns, besides the season and track_type partition keys in the path
+ARCHIVE_COLUMNS = (
+    "race_id", "race_name", "track_length_km", "participation_fee", "prize_pool", "race_date",
+    "car_id", "team_id", "finish_time", "position", "prize_awarded",
+)
+
+# Race ids per DELETE statement when clearing archived races from the hot tables
+DELETE_BATCH = 1000
+
+# Races old enough to archive, with their results. Calendar races without
+# results are left alone.
+ARCHIVABLE_QUERY = """
+SELECT r.race_id, r.race_name, CAST(r.track_length_km AS DOUBLE), CAST(r.participation_fee AS DOUBLE),
+       CAST(r.prize_pool AS DOUBLE), r.race_date, rr.car_id, rr.team_id,
+       CAST(rr.finish_time AS DOUBLE), rr.position, CAST(rr.prize_awarded AS DOUBLE),
+       r.track_type
+FROM bootcamp_rally.races.races r
+JOIN bootcamp_rally.races.race_results rr ON rr.race_id = r.race_id
+WHERE r.race_date < ?
+ORDER BY r.race_date, r.race_id, rr.position
+"""
+
+
+def _duckdb():
+    import duckdb
+    return duckdb.connect()
+
+
+# Partition name of races without a track type, which hive partitioning reads back as NULL
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _partition_dir(directory, season, track_type):
+    track_type = NULL_PARTITION if track_type is None else track_type
+    return os.path.join(directory, "race_results", f"season={season}", f"track_type={track_type}")
+
+
+def _files_glob(directory):
+    return os.path.join(directory, "race_results", "*", "*", "*.parquet")
+
+
+# Whether the archive holds any data
+def has_archive(directory=None):
+    return bool(glob.glob(_files_glob(directory or ARCHIVE_DIR)))
+
+
+# Move every race older than `older_than_days` (with its results) out of the hot
+# tables into Parquet under `directory`, partitioned by season (year of the race)
+# and track type. Each touched partition is compacted into a single file sorted
+# by race date. New files are written first under temporary names, the hot rows
+# are deleted in one transaction, and only then are the files swapped in, so a
+# failed run leaves both the database and the archive as they were.
+# Returns the number of races and result rows archived.
+def archive_races(pool, older_than_days=DEFAULT_HORIZON_DAYS, directory=None):
+    directory = directory or ARCHIVE_DIR
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    columns = ARCHIVE_COLUMNS + ("track_type",)
+    rows = pool.query_frame(ARCHIVABLE_QUERY, (cutoff,), columns=columns)
+    if rows.empty:
+        return {"races": 0, "race_results": 0}
+    rows["season"] = rows["race_date"].dt.year
+
+    con = _duckdb()
+    staged = []
+    race_ids = set()
+    try:
+        con.register("new_rows", rows)
+        for (season, track_type), group in rows.groupby(["season", "track_type"], dropna=False):
+            # groupby gives NaN for the NULL key
+            track_type = None if isinstance(track_type, float) else track_type
+            target = _partition_dir(directory, season, track_type)
+            os.makedirs(target, exist_ok=True)
+            existing = sorted(glob.glob(os.path.join(target, "*.parquet")))
+            column_list = ", ".join(ARCHIVE_COLUMNS)
+            if track_type is None:
+                track_filter = "track_type IS NULL"
+            else:
+                track_filter = "track_type = '" + track_type.replace("'", "''") + "'"
+            sources = [f"""
+                SELECT {column_list} FROM new_rows
+                WHERE season = {int(season)} AND {track_filter}
+            """]
+            if existing:
+                sources.append(f"SELECT {column_list} FROM read_parquet({existing!r})")
+            temporary = os.path.join(target, f"part-{uuid.uuid4().hex}.parquet.tmp")
+            con.execute(f"""
+                COPY ({" UNION ALL ".join(sources)} ORDER BY race_date, race_id, position)
+                TO '{temporary}' (FORMAT PARQUET, COMPRESSION ZSTD)
+            """)
+            staged.append((temporary, existing))
+            race_ids.update(group["race_id"].tolist())
+
+        # Only races written to a staged file are removed from the hot tables
+        race_ids = sorted(race_ids)
+        with pool.transaction() as cur:
+            for start in range(0, len(race_ids), DELETE_BATCH):
+                batch = race_ids[start:start + DELETE_BATCH]
+                placeholders = ", ".join(["?"] * len(batch))
+                cur.execute(f"DELETE FROM bootcamp_rally.races.race_results WHERE race_id IN ({placeholders})", batch)
+                cur.execute(f"DELETE FROM bootcamp_rally.races.races WHERE race_id IN ({placeholders})", batch)
+    except Exception:
+        for temporary, _ in staged:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        raise
+    finally:
+        con.close()
+
+    for temporary, existing in staged:
+        os.replace(temporary, temporary[:-len(".tmp")])
+        for path in existing:
+            os.remove(path)
+    _write_race_names(directory)
+    return {"races": len(race_ids), "race_results": int(rows["race_id"].isin(race_ids).sum())}
+
+
+# Run a query over the archived results, exposed as the view `archived_results`
+# (the archive columns plus season and track_type). Only the columns and
+# partitions the query needs are read. Returns a DataFrame.
+def query(sql, params=None, directory=None):
+    con = _duckdb()
+    try:
+        con.execute(f"""
+            CREATE VIEW archived_results AS
+            SELECT * FROM read_parquet('{_files_glob(directory or ARCHIVE_DIR)}', hive_partitioning = true)
+        """)
+        return con.execute(sql, params or []).fetch_df()
+    finally:
+        con.close()
+
+
+RESULT_FRAME_COLUMNS = (
+    "race_id", "race_name", "track_type", "track_length_km", "race_date",
+    "car_id", "team_id", "finish_time", "position", "prize_awarded",
+)
+
+RESULTS_QUERY = """
+SELECT r.race_id, r.race_name, r.track_type, CAST(r.track_length_km AS DOUBLE), r.race_date,
+       rr.car_id, rr.team_id, CAST(rr.finish_time AS DOUBLE), rr.position, CAST(rr.prize_awarded AS DOUBLE)
+FROM bootcamp_rally.races.race_results rr
+JOIN bootcamp_rally.races.races r ON rr.race_id = r.race_id
+"""
+
+
+# One page of archived history, newest first, for View Results. `conditions` are
+# SQL filters on the archive columns with `params`; team and car are returned as
+# ids, since their names live in the hot tables.
+def history_page(conditions, params, limit, directory=None):
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return query(f"""
+        SELECT race_name, position, team_id, car_id, finish_time, prize_awarded, race_date, race_id
+        FROM archived_results
+        {where}
+        ORDER BY race_date DESC, race_id DESC, position
+        LIMIT ?
+    """, list(params) + [limit], directory=directory)
+
+
+# Archived race names per list file, as (modification time, names)
+_race_names_cache = {}
+
+
+def _race_names_path(directory):
+    return os.path.join(directory, "race_names.json")
+
+
+# Names of the archived races. Each archive run rewrites a small list of them next
+# to the data, so pages read that instead of scanning the archive; it is kept in
+# memory until the file changes.
+def race_names(directory=None):
+    directory = directory or ARCHIVE_DIR
+    path = _race_names_path(directory)
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        if not has_archive(directory):
+            return []
+        _write_race_names(directory)
+        modified = os.path.getmtime(path)
+    cached = _race_names_cache.get(path)
+    if cached is None or cached[0] != modified:
+        with open(path) as f:
+            cached = (modified, json.load(f))
+        _race_names_cache[path] = cached
+    return cached[1]
+
+
+def _write_race_names(directory):
+    names = query("SELECT DISTINCT race_name FROM archived_results ORDER BY race_name", directory=directory)
+    temporary = _race_names_path(directory) + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(names["race_name"].tolist(), f)
+    os.replace(temporary, _race_names_path(directory))
+
+
+# Every race result, hot and archived, as one frame for analytics
+def all_results(pool, directory=None):
+    import pandas as pd
+    hot = pool.query_frame(RESULTS_QUERY, columns=RESULT_FRAME_COLUMNS)
+    if not has_archive(directory):
+        return hot
+    cold = query(f"SELECT {', '.join(RESULT_FRAME_COLUMNS)} FROM archived_results", directory=directory)
+    return pd.concat([hot, cold], ignore_index=True)
+
+
+# Standings totals of the archived results, per team and per car, in the
+# race_engine.standings_delta layout, for rebuilding standings from full history
+def standings_deltas(directory=None):
+    if not has_archive(directory):
+        return {}
+    points = " ".join(
+        f"WHEN {position} THEN {value}" for position, value in enumerate(race_engine.CHAMPIONSHIP_POINTS, start=1)
+    )
+    deltas = {}
+    for kind, key in (("team", "team_id"), ("car", "car_id")):
+        frame = query(f"""
+            SELECT {key}, SUM(CASE position {points} ELSE 0 END), COUNT(*), COUNT(finish_time),
+                   SUM(CASE WHEN position = 1 THEN 1 ELSE 0 END), SUM(CASE WHEN position <= 3 THEN 1 ELSE 0 END),
+                   COALESCE(SUM(prize_awarded), 0), COALESCE(SUM(finish_time), 0)
+            FROM archived_results
+            GROUP BY {key}
+        """, directory=directory)
+        deltas[kind] = {
+            int(row[0]): [int(row[1]), int(row[2]), int(row[3]), int(row[4]), int(row[5]), float(row[6]), float(row[7])]
+            for row in frame.itertuples(index=False, name=None)
+        }
+    return deltas
@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import datagen
+import db
+import instrumentation
+import local_db
+
+# Imports app in a fresh interpreter and prints how long that took
+_IMPORT_APP = (
+    "import time; started = time.perf_counter(); "
+    "from streamlit import logger; logger.set_log_level('error'); "
+    "import app; print(time.perf_counter() - started)"
+)
+
+# Stage regressions smaller than this are treated as noise
+NOISE_FLOOR_S = 0.002
+
+# Statements of the persist stage timed on their own, matched on their recorded
+# (normalized) SQL: the budget settlement, and the results load (an INSERT, or
+# PUT and COPY INTO for large loads on Snowflake)
+PERSIST_STATEMENTS = {
+    "race.persist.settlement": re.compile(r"^UPDATE bootcamp_rally\.teams\.teams\b", re.IGNORECASE),
+    "race.persist.results_insert": re.compile(
+        r"^(?:INSERT INTO |COPY INTO |PUT \? @)bootcamp_rally\.races\.%?race_results\b", re.IGNORECASE
+    ),
+}
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min_s": ordered[0],
+        "median_s": statistics.median(ordered),
+        "p95_s": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "mean_s": statistics.fmean(ordered),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _timed(samples, name, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.setdefault(name, []).append(time.perf_counter() - started)
+    return result
+
+
+# Add the time of each PERSIST_STATEMENTS entry, from a race's query events
+def _persist_statements(samples, events):
+    for name, pattern in PERSIST_STATEMENTS.items():
+        seconds = sum(event["ms"] for event in events if event["kind"] == "query" and pattern.match(event["sql"])) / 1000
+        samples.setdefault(name, []).append(seconds)
+
+
+# Time every stage of the race pipeline plus the dashboard and history reads.
+# Reads run with a cold cache so they measure the database, not the cache.
+def run(pool, app, repeat=5, seed=0):
+    samples = {}
+    races = app.get_races(pool)
+    if not races:
+        raise SystemExit("No races in the database; generate a league first.")
+    race_id = min(races, key=lambda race: race[4])[0]
+    stage_labels = dict(app.RACE_STAGES)
+
+    for n in range(repeat):
+        pool.cache.clear()
+        request = instrumentation.RECORDER.begin_request("bench")
+        started = time.perf_counter()
+        for stage, payload in app.race_stages(pool, race_id, seed=seed + n):
+            if stage == "failed":
+                raise SystemExit(f"Race failed: {payload}")
+            finished = time.perf_counter()
+            samples.setdefault(f"race.{stage}", []).append(finished - started)
+            started = finished
+        _persist_statements(samples, instrumentation.RECORDER.events(request["id"]))
+
+        pool.cache.clear()
+        _timed(samples, "dashboard.teams", app.get_team_budgets, pool)
+        _timed(samples, "dashboard.cars", app.get_cars, pool)
+        _timed(samples, "dashboard.races", app.get_races, pool)
+        pool.cache.clear()
+        _timed(samples, "dashboard.concurrent", app.load_dashboard, pool)
+
+        pool.cache.clear()
+        page, _ = _timed(samples, "history.first_page", app.get_race_history, pool)
+        if not page.empty:
+            pool.cache.clear()
+            _timed(samples, "history.next_page", app.get_race_history, pool, app.history_cursor(page))
+        pool.cache.clear()
+        _timed(samples, "history.filtered", app.get_race_history, pool, track_type="Snow")
+        pool.cache.clear()
+        _timed(samples, "standings.teams", app.get_team_standings, pool)
+
+    return {
+        "stages": {name: _summary(values) for name, values in samples.items()},
+        "labels": {
+            **{f"race.{name}": label for name, label in stage_labels.items()},
+            "race.persist.settlement": "Recording results: budget settlement statement",
+            "race.persist.results_insert": "Recording results: race results insert",
+        },
+    }
+
+
+# Time importing the app in a fresh interpreter, the part of a cold start the
+# app controls. Compare with app.FIRST_PAINT_BUDGET_S.
+def cold_start(repeat=5):
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_APP], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return _summary(samples)
+
+
+# Stages whose median got slower than the baseline by more than `tolerance`
+def regressions(report, baseline, tolerance):
+    found = []
+    for name, stats in report["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before:
+            continue
+        slower = stats["median_s"] - before["median_s"]
+        if slower > NOISE_FLOOR_S and stats["median_s"] > before["median_s"] * (1 + tolerance):
+            found.append({"stage": name, "baseline_s": before["median_s"], "current_s": stats["median_s"]})
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the race pipeline against a local database or Snowflake")
+    parser.add_argument("--database", default=":memory:", help="DuckDB file (default: a fresh in-memory database)")
+    parser.add_argument("--secrets", help="Benchmark Snowflake using this secrets.toml instead of a local database")
+    parser.add_argument("--teams", type=int, default=1000, help="Teams to generate in a fresh local database")
+    parser.add_argument("--cars-per-team", type=int, default=2)
+    parser.add_argument("--history-races", type=int, default=200)
+    parser.add_argument("--entrants", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs the baseline median")
+    args = parser.parse_args(argv)
+
+    # The app's query helpers run fine outside a Streamlit session
+    from streamlit import logger
+    logger.set_log_level("error")
+    import app
+
+    if args.secrets:
+        pool = db.snowflake_pool(db.load_secrets(args.secrets))
+        generated = None
+    else:
+        pool = local_db.LocalPool(args.database).create_schema()
+        has_data = pool.query("SELECT COUNT(*) FROM bootcamp_rally.cars.cars")[0][0]
+        generated = None if has_data else datagen.generate(
+            pool, teams=args.teams, cars_per_team=args.cars_per_team,
+            history_races=args.history_races, entrants=args.entrants, seed=args.seed
+        )
+
+    try:
+        report = run(pool, app, repeat=args.repeat, seed=args.seed)
+    finally:
+        pool.close()
+    report["stages"]["startup.import_app"] = cold_start(args.repeat)
+
+    report["meta"] = {
+        "backend": "snowflake" if args.secrets else "duckdb",
+        "database": None if args.secrets else args.database,
+        "generated": generated,
+        "repeat": args.repeat,
+        "first_paint_budget_s": app.FIRST_PAINT_BUDGET_S,
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = regressions(report, json.load(f), args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    for regression in report.get("regressions", []):
+        print(
+            f"REGRESSION {regression['stage']}: {regression['baseline_s'] * 1000:.1f} ms -> "
+            f"{regression['current_s'] * 1000:.1f} ms", file=sys.stderr
+        )
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
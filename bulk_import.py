@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import race_engine
+
+# Budget given to imported teams without one, as in the teams table default
+DEFAULT_BUDGET = 10000
+
+TEAM_COLUMNS = ("team_name", "budget")
+CAR_COLUMNS = ("team_id", "model") + race_engine.STAT_COLUMNS
+
+ERROR_COLUMNS = ["row", "column", "error"]
+
+
+# Read a CSV or Parquet file (a path, or an uploaded file with a .name) into a DataFrame
+def read_table(source, name=None):
+    name = name or getattr(source, "name", None) or str(source)
+    extension = os.path.splitext(name)[1].lower()
+    if extension == ".csv":
+        frame = pd.read_csv(source)
+    elif extension in (".parquet", ".pq"):
+        try:
+            frame = pd.read_parquet(source)
+        except ImportError:
+            raise ValueError("Reading Parquet needs pyarrow. Run: pip install pyarrow") from None
+    else:
+        raise ValueError(f"Unsupported file type '{extension}'; use .csv or .parquet")
+    frame.columns = [str(column).strip().lower() for column in frame.columns]
+    return frame.reset_index(drop=True)
+
+
+# Collects rejected rows: every check adds the rows where its mask is True
+class _Errors:
+    def __init__(self, count):
+        self.bad = np.zeros(count, dtype=bool)
+        self.parts = []
+
+    def add(self, mask, column, message):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            rows = np.flatnonzero(mask)
+            # 1-based data row numbers, as a spreadsheet shows them below the header
+            self.parts.append(pd.DataFrame({"row": rows + 1, "column": column, "error": message}))
+            self.bad |= mask
+
+    def frame(self):
+        if not self.parts:
+            return pd.DataFrame(columns=ERROR_COLUMNS)
+        return pd.concat(self.parts, ignore_index=True).sort_values("row", kind="stable").reset_index(drop=True)
+
+
+def _text(frame, column):
+    return frame[column].astype("string").str.strip()
+
+
+# Validate team rows against the existing team names. Returns the rows to load,
+# as (team_name, budget) tuples, and the error report.
+def validate_teams(frame, existing_names):
+    errors = _Errors(len(frame))
+    if "team_name" not in frame:
+        errors.add(np.ones(len(frame), dtype=bool), "team_name", "missing column")
+        return [], errors.frame()
+
+    names = _text(frame, "team_name")
+    missing = names.isna() | (names == "")
+    errors.add(missing, "team_name", "team name is required")
+    errors.add(~missing & names.duplicated(keep="first"), "team_name", "duplicate team name in file")
+    errors.add(~missing & names.isin(set(existing_names)), "team_name", "team already exists")
+
+    if "budget" in frame:
+        raw = frame["budget"]
+        budgets = pd.to_numeric(raw, errors="coerce")
+        errors.add(raw.notna() & budgets.isna(), "budget", "budget must be a number")
+        errors.add(budgets < 0, "budget", "budget cannot be negative")
+        budgets = budgets.fillna(DEFAULT_BUDGET)
+    else:
+        budgets = pd.Series(DEFAULT_BUDGET, index=frame.index, dtype="float64")
+
+    keep = ~errors.bad
+    rows = list(zip(names[keep].tolist(), budgets[keep].astype(float).round(2).tolist()))
+    return rows, errors.frame()
+
+
+# Validate car rows. Cars name their team by team_id or team_name; `teams` maps
+# existing team ids to names. Stats must be whole numbers within the Manage Cars
+# slider bounds. Returns (team_id, model, speed, horsepower, handling, durability)
+# tuples to load and the error report.
+def validate_cars(frame, teams):
+    errors = _Errors(len(frame))
+    required = [column for column in ("model",) + race_engine.STAT_COLUMNS if column not in frame]
+    if "team_id" not in frame and "team_name" not in frame:
+        required.insert(0, "team_id or team_name")
+    if required:
+        errors.add(np.ones(len(frame), dtype=bool), ", ".join(required), "missing column")
+        return [], errors.frame()
+
+    if "team_id" in frame:
+        team_ids = pd.to_numeric(frame["team_id"], errors="coerce")
+        errors.add(~team_ids.isin(set(teams)), "team_id", "team does not exist")
+    else:
+        ids_by_name = {name: team_id for team_id, name in teams.items()}
+        team_ids = _text(frame, "team_name").map(ids_by_name)
+        errors.add(team_ids.isna(), "team_name", "team does not exist")
+
+    models = _text(frame, "model")
+    errors.add(models.isna() | (models == ""), "model", "model is required")
+
+    stats = {}
+    for column in race_engine.STAT_COLUMNS:
+        low, high = race_engine.STAT_BOUNDS[column]
+        values = pd.to_numeric(frame[column], errors="coerce")
+        errors.add(values.isna(), column, "must be a number")
+        errors.add(values.notna() & (values != values.round()), column, "must be a whole number")
+        errors.add((values < low) | (values > high), column, f"must be between {low} and {high}")
+        stats[column] = values
+
+    keep = ~errors.bad
+    columns = [team_ids[keep].astype("int64"), models[keep]] + [
+        stats[column][keep].astype("int64") for column in race_engine.STAT_COLUMNS
+    ]
+    rows = list(zip(*(column.tolist() for column in columns)))
+    return rows, errors.frame()
+
+
+def _load(pool, table, columns, rows):
+    # One bulk load in one transaction; committing it refreshes the cached reads once
+    with pool.transaction() as cur:
+        pool.bulk_insert(cur, table, columns, rows)
+
+
+# Validate and load a team file. Returns the number of teams loaded and the error report.
+def import_teams(pool, frame):
+    existing = [row[0] for row in pool.query("SELECT team_name FROM bootcamp_rally.teams.teams")]
+    rows, errors = validate_teams(frame, existing)
+    if rows:
+        _load(pool, "bootcamp_rally.teams.teams", TEAM_COLUMNS, rows)
+    return len(rows), errors
+
+
+# Validate and load a car file. Returns the number of cars loaded and the error report.
+def import_cars(pool, frame):
+    teams = dict(pool.query("SELECT team_id, team_name FROM bootcamp_rally.teams.teams"))
+    rows, errors = validate_cars(frame, teams)
+    if rows:
+        _load(pool, "bootcamp_rally.cars.cars", CAR_COLUMNS, rows)
+    return len(rows), errors
@@ -0,0 +1,176 @@
+import argparse
+import sys
+
+import db
+import season
+import standings
+
+
+def rebuild_standings(pool, args):
+    import archive
+    standings.rebuild(pool, archive.standings_deltas(args.archive_dir))
+    print("Standings rebuilt from race history.")
+
+
+def archive_races(pool, args):
+    import archive
+    archived = archive.archive_races(pool, args.older_than_days, args.archive_dir)
+    print(f"Archived {archived['races']} races ({archived['race_results']} results) "
+          f"to {args.archive_dir or archive.ARCHIVE_DIR}.")
+
+
+def run_season(pool, args):
+    results = season.run_season(pool, args.race or None, seed=args.seed, workers=args.workers)
+    if not results:
+        print("No races to run.")
+    for race, race_results in results:
+        if race_results:
+            winner = race_results[0]
+            print(f"{race[1]}: {len(race_results)} cars, won by {winner['team_name']} {winner['model']} "
+                  f"in {winner['finish_time']:.2f}s")
+        else:
+            print(f"{race[1]}: no team could afford the fee")
+
+
+def _report_import(kind, loaded, errors):
+    print(f"Imported {loaded} {kind}.")
+    if not errors.empty:
+        print(f"{errors['row'].nunique()} rows rejected:", file=sys.stderr)
+        print(errors.to_csv(index=False), end="", file=sys.stderr)
+        return 1
+    return 0
+
+
+def import_teams(pool, args):
+    import bulk_import
+    return _report_import("teams", *bulk_import.import_teams(pool, bulk_import.read_table(args.file)))
+
+
+def import_cars(pool, args):
+    import bulk_import
+    return _report_import("cars", *bulk_import.import_cars(pool, bulk_import.read_table(args.file)))
+
+
+def optimize_setup(pool, args):
+    import optimizer
+    import race_engine
+    race = season.load_calendar(pool, [args.race])[0]
+    race_id, race_name, track_length, track_type, fee, prize_pool = race
+    budget = args.budget / 100 * len(race_engine.STAT_COLUMNS)
+    best = optimizer.optimize_setup(track_type, track_length, budget)
+    if best is None:
+        print("No setup fits this budget.")
+        return 1
+    stats = ", ".join(f"{column} {value}" for column, value in best["setup"].items())
+    print(f"{race_name} ({track_type}, {track_length:g} km): {stats}; "
+          f"expected finish {best['expected_finish_time']:.2f}s ({best['evaluations']:,} setups evaluated)")
+    roster = pool.query_frame(season.ROSTER_QUERY, columns=season.ROSTER_COLUMNS)
+    participants = race_engine.select_participants(roster.itertuples(index=False, name=None), fee)
+    if participants:
+        rating = optimizer.rate_against_field(
+            best["setup"], race_engine.load_grid(participants), track_type, track_length, prize_pool, seed=args.seed
+        )
+        print(f"Against {len(participants)} entrants: {rating['win']:.1%} win, {rating['podium']:.1%} podium, "
+              f"expected position {rating['expected_position']:.2f}")
+    return 0
+
+
+def migrate(pool, args):
+    import migrations
+    if args.status:
+        for version, name, applied_at in migrations.status(pool):
+            print(f"{version:04d} {name}: {applied_at or 'pending'}")
+        return 0
+    ran = migrations.migrate(pool, args.to)
+    for version, name in ran:
+        print(f"Applied {version:04d} {name}")
+    if not ran:
+        print("Schema is up to date.")
+    return 0
+
+
+def check_plans(pool, args):
+    import plan_check
+    plans = plan_check.current_plans(pool)
+    if args.update_baseline:
+        plan_check.save_baseline(plans)
+        print(f"Saved plans of {len(plans)} queries to {plan_check.BASELINE_FILE}.")
+        return 0
+    problems = plan_check.compare(plans, plan_check.load_baseline())
+    for label, problem in problems:
+        print(f"{label}: {problem}", file=sys.stderr)
+    if problems:
+        print("Run check-plans --update-baseline once the new plans are intended.", file=sys.stderr)
+        return 1
+    print(f"Plans of {len(plans)} queries match the baseline.")
+    return 0
+
+
+# Pool for the database the command should use
+def open_pool(args):
+    if args.command == "check-plans" and not args.local:
+        import plan_check
+        return plan_check.check_pool()
+    if args.local:
+        import local_db
+        return local_db.LocalPool(args.local).create_schema()
+    return db.snowflake_pool(db.load_secrets(args.secrets))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rally racing management commands")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="Streamlit secrets file with a [snowflake] section")
+    parser.add_argument("--local", metavar="DUCKDB_FILE", help="Use a local DuckDB database instead of Snowflake")
+    parser.add_argument("--archive-dir", help="Directory of archived race results (default: RALLY_ARCHIVE_DIR or ./archive)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    rebuild = commands.add_parser("rebuild-standings", help="Recompute team and car standings from all race results")
+    rebuild.set_defaults(handler=rebuild_standings)
+    
+    migrate_parser = commands.add_parser("migrate", help="Apply pending schema migrations from migrations/")
+    migrate_parser.add_argument("--to", type=int, metavar="VERSION", help="Stop after this migration")
+    migrate_parser.add_argument("--status", action="store_true", help="List migrations and when they were applied")
+    migrate_parser.set_defaults(handler=migrate)
+    
+    plans_parser = commands.add_parser(
+        "check-plans", help="EXPLAIN every app.py query on the local schema and compare with plan_baseline.json"
+    )
+    plans_parser.add_argument("--update-baseline", action="store_true", help="Accept the current plans as the baseline")
+    plans_parser.set_defaults(handler=check_plans)
+    
+    archive_parser = commands.add_parser("archive", help="Move old races and their results to Parquet files")
+    archive_parser.add_argument("--older-than-days", type=int, default=365, help="Archive races older than this")
+    archive_parser.set_defaults(handler=archive_races)
+    
+    season_parser = commands.add_parser("run-season", help="Simulate a list of races, or every calendar race, in one job")
+    season_parser.add_argument("--race", type=int, action="append", metavar="RACE_ID", help="Race to run (repeatable, run in the given order)")
+    season_parser.add_argument("--seed", type=int, help="Seed for reproducible results")
+    season_parser.add_argument("--workers", type=int, help="Processes used for scoring (1 = no process pool)")
+    season_parser.set_defaults(handler=run_season)
+    
+    optimize_parser = commands.add_parser("optimize-setup", help="Best stat setup for a race within a stat budget")
+    optimize_parser.add_argument("--race", type=int, required=True, metavar="RACE_ID")
+    optimize_parser.add_argument("--budget", type=float, default=50, help="Stat budget as a percentage of a fully maxed car")
+    optimize_parser.add_argument("--seed", type=int, help="Seed for the rating against the field")
+    optimize_parser.set_defaults(handler=optimize_setup)
+    
+    teams_parser = commands.add_parser("import-teams", help="Load teams (team_name, budget) from a CSV or Parquet file")
+    teams_parser.add_argument("file")
+    teams_parser.set_defaults(handler=import_teams)
+    
+    cars_parser = commands.add_parser(
+        "import-cars", help="Load cars (team_id or team_name, model, speed, horsepower, handling, durability) from a CSV or Parquet file"
+    )
+    cars_parser.add_argument("file")
+    cars_parser.set_defaults(handler=import_cars)
+    
+    args = parser.parse_args(argv)
+    pool = open_pool(args)
+    try:
+        return args.handler(pool, args)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
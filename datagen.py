@@ -0,0 +1,143 @@
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import race_engine
+
+TRACK_TYPES = ("Asphalt", "Snow", "Gravel")
+
+RACE_NAMES = (
+    "Monaco Grand Prix", "Swedish Rally", "Safari Rally Kenya", "Rally Finland", "Rally Japan",
+    "Acropolis Rally", "Rally Portugal", "Monte Carlo Rally", "Rally Sardegna", "Rally Chile",
+)
+
+
+# Ids of rows inserted with a given name prefix, in insertion order
+def _ids_by_prefix(pool, query, prefix):
+    return [row[0] for row in pool.query(query, (prefix + "%",))]
+
+
+# Fill a database with a synthetic league: `teams` teams with `cars_per_team`
+# cars each, a calendar of `races` upcoming races and `history_races` past races
+# with results for up to `entrants` cars each. Names carry `prefix` so several
+# generated leagues can live side by side. Returns the row counts written.
+def generate(pool, teams=100, cars_per_team=2, races=20, history_races=0, entrants=50,
+             seed=0, prefix="Gen "):
+    rng = np.random.default_rng(seed)
+
+    team_rows = [
+        (f"{prefix}Team {i:06d}", float(budget))
+        for i, budget in enumerate(rng.uniform(50_000, 500_000, teams).round(2))
+    ]
+    with pool.transaction() as cur:
+        pool.bulk_insert(cur, "bootcamp_rally.teams.teams", ("team_name", "budget"), team_rows)
+    team_ids = _ids_by_prefix(
+        pool, "SELECT team_id FROM bootcamp_rally.teams.teams WHERE team_name LIKE ? ORDER BY team_name", prefix
+    )
+
+    car_team_ids = np.repeat(np.asarray(team_ids), cars_per_team)
+    stats = {
+        column: rng.integers(max(low, high // 2), high + 1, car_team_ids.shape[0])
+        for column, (low, high) in race_engine.STAT_BOUNDS.items()
+    }
+    car_rows = [
+        (int(team_id), f"{prefix}Car {i:07d}", *(int(stats[column][i]) for column in race_engine.STAT_COLUMNS))
+        for i, team_id in enumerate(car_team_ids)
+    ]
+    with pool.transaction() as cur:
+        pool.bulk_insert(
+            cur, "bootcamp_rally.cars.cars",
+            ("team_id", "model") + race_engine.STAT_COLUMNS, car_rows
+        )
+    cars = pool.query(
+        "SELECT car_id, team_id, speed, horsepower, handling, durability FROM bootcamp_rally.cars.cars "
+        "WHERE model LIKE ? ORDER BY model", (prefix + "%",)
+    )
+
+    # Ids come from the sequence like every other race insert
+    calendar_ids = pool.next_ids("bootcamp_rally.races.race_id_seq", races)
+    race_rows = [
+        (race_id, f"{prefix}{RACE_NAMES[i % len(RACE_NAMES)]} {i // len(RACE_NAMES) + 1}",
+         float(rng.integers(80, 151)), TRACK_TYPES[rng.integers(len(TRACK_TYPES))],
+         float(rng.integers(5, 21) * 100), float(rng.integers(5, 21) * 1000))
+        for i, race_id in enumerate(calendar_ids)
+    ]
+    with pool.transaction() as cur:
+        pool.bulk_insert(
+            cur, "bootcamp_rally.races.races",
+            ("race_id", "race_name", "track_length_km", "track_type", "participation_fee", "prize_pool"), race_rows
+        )
+
+    result_count = 0
+    if history_races and cars:
+        car_ids = np.asarray([car[0] for car in cars])
+        car_teams = np.asarray([car[1] for car in cars])
+        grid = {column: np.asarray([float(car[i + 2]) for car in cars]) for i, column in enumerate(race_engine.STAT_COLUMNS)}
+        race_ids = pool.next_ids("bootcamp_rally.races.race_id_seq", history_races)
+        start = datetime.now() - timedelta(days=history_races)
+
+        past_races = []
+        result_rows = []
+        for n, race_id in enumerate(race_ids):
+            name, length, track_type, fee, prize_pool = race_rows[n % len(race_rows)][1:] if race_rows else (
+                f"{prefix}Historic Race", 100.0, "Gravel", 1000.0, 5000.0)
+            past_races.append((race_id, name, length, track_type, fee, prize_pool, start + timedelta(days=n)))
+
+            field = rng.choice(len(car_ids), size=min(entrants, len(car_ids)), replace=False)
+            field_grid = {column: values[field] for column, values in grid.items()}
+            finish_times = race_engine.score_grid(field_grid, track_type, length, seed=rng)
+            for position, i in enumerate(race_engine.rank_grid(finish_times), start=1):
+                paid = position <= len(race_engine.PRIZE_DISTRIBUTION)
+                prize = prize_pool * race_engine.PRIZE_DISTRIBUTION[position - 1] if paid else 0.0
+                result_rows.append((
+                    race_id, int(car_ids[field[i]]), int(car_teams[field[i]]),
+                    round(float(finish_times[i]), 2), position, prize
+                ))
+
+        with pool.transaction() as cur:
+            pool.bulk_insert(
+                cur, "bootcamp_rally.races.races",
+                ("race_id", "race_name", "track_length_km", "track_type", "participation_fee", "prize_pool", "race_date"),
+                past_races
+            )
+            pool.bulk_insert(
+                cur, "bootcamp_rally.races.race_results",
+                ("race_id", "car_id", "team_id", "finish_time", "position", "prize_awarded"),
+                result_rows
+            )
+        result_count = len(result_rows)
+
+    return {
+        "teams": len(team_rows),
+        "cars": len(car_rows),
+        "races": len(race_rows) + history_races,
+        "race_results": result_count,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic rally league in a local DuckDB database")
+    parser.add_argument("database", help="DuckDB file to create or extend")
+    parser.add_argument("--teams", type=int, default=100)
+    parser.add_argument("--cars-per-team", type=int, default=2)
+    parser.add_argument("--races", type=int, default=20)
+    parser.add_argument("--history-races", type=int, default=0)
+    parser.add_argument("--entrants", type=int, default=50, help="Cars per historical race")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import local_db
+    pool = local_db.LocalPool(args.database).create_schema()
+    try:
+        counts = generate(
+            pool, teams=args.teams, cars_per_team=args.cars_per_team, races=args.races,
+            history_races=args.history_races, entrants=args.entrants, seed=args.seed
+        )
+    finally:
+        pool.close()
+    print(", ".join(f"{count:,} {table}" for table, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
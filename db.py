@@ -0,0 +1,471 @@
+import csv
+import decimal
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import instrumentation
+
+# Snowflake error numbers meaning the session is gone and the connection has to be replaced
+SESSION_EXPIRED_ERRNOS = {
+    250001,  # Could not connect to Snowflake backend
+    390111,  # Session no longer exists
+    390112,  # Session has expired
+    390114,  # Authentication token has expired
+}
+
+
+# Fully qualified table references, e.g. bootcamp_rally.races.race_results
+TABLE_PATTERN = re.compile(r"bootcamp_rally\.\w+\.(\w+)", re.IGNORECASE)
+
+# Bulk inserts larger than this are loaded through the table stage instead of a multi-row insert
+STAGED_LOAD_THRESHOLD = 5000
+
+# SQL keywords that only read data
+READ_ONLY_PREFIXES = ("SELECT", "WITH", "SHOW", "DESCRIBE", "EXPLAIN")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# A concurrent transaction changed the same rows first; the work can be retried
+class WriteConflict(Exception):
+    pass
+
+
+# Table names a statement touches, used as cache tags
+def tables_in(sql):
+    return frozenset(name.lower() for name in TABLE_PATTERN.findall(sql))
+
+
+def is_write(sql):
+    return not sql.lstrip().upper().startswith(READ_ONLY_PREFIXES)
+
+
+# Query results tagged with the tables they read. Entries live until a write
+# touches one of their tables; a per-table generation counter keeps a read
+# that overlapped a write from storing stale rows.
+class QueryCache:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    # Snapshot of the generations of the given tables, taken before reading
+    def generation(self, tables):
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in sorted(tables))
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, self._entries[key][1]
+
+    def put(self, key, tables, generation, rows):
+        with self._lock:
+            current = tuple(self._generations.get(table, 0) for table in sorted(tables))
+            if current != generation:
+                return
+            self._entries[key] = (tables, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # Drop every entry that read from any of the given tables
+    def invalidate(self, tables):
+        if not tables:
+            return
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [key for key, (tagged, _) in self._entries.items() if tagged & tables]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Cursor wrapper remembering which tables a transaction wrote to and timing each statement
+class _TrackingCursor:
+    def __init__(self, cursor, recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+        self.written = set()
+
+    def _timed(self, sql, fn):
+        started = time.perf_counter()
+        error = None
+        try:
+            return fn()
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self._recorder.query(
+                sql, time.perf_counter() - started,
+                sfqid=getattr(self._cursor, "sfqid", None), error=error
+            )
+
+    def execute(self, sql, params=None):
+        if is_write(sql):
+            self.written |= tables_in(sql)
+        return self._timed(sql, lambda: self._cursor.execute(sql, params))
+
+    def executemany(self, sql, rows):
+        self.written |= tables_in(sql)
+        return self._timed(sql, lambda: self._cursor.executemany(sql, rows))
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# Rows in a query result (list of rows or DataFrame); statements return their affected row count
+def _row_count(result):
+    if result is None or isinstance(result, int):
+        return result
+    return len(result)
+
+
+# Build a DataFrame from DB-API rows, turning Decimal columns into float64
+def frame_from_rows(rows, columns):
+    import pandas as pd
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    for column in frame.columns:
+        values = frame[column].dropna()
+        if frame[column].dtype == object and len(values) and isinstance(values.iloc[0], decimal.Decimal):
+            frame[column] = frame[column].astype("float64")
+    return frame
+
+
+# Check whether an error means the connection's session has expired
+def is_session_expired(error):
+    return getattr(error, "errno", None) in SESSION_EXPIRED_ERRNOS
+
+
+# Bounded pool of database connections with bind-parameter helpers.
+# `connect` is a zero-argument callable returning a new DB-API connection.
+class ConnectionPool:
+    def __init__(self, connect, size=4, timeout=30, health_check_after=300):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.cache = QueryCache()
+        self.recorder = instrumentation.RECORDER
+
+    # Run a cheap query to make sure an idle connection still works
+    def ping(self, conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            return True
+        except Exception:
+            return False
+
+    def _is_healthy(self, conn, idle_since):
+        is_closed = getattr(conn, "is_closed", None)
+        if is_closed is not None and is_closed():
+            return False
+        if time.monotonic() - idle_since > self.health_check_after:
+            return self.ping(conn)
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        try:
+            while True:
+                try:
+                    conn, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._is_healthy(conn, idle_since):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn, broken=False):
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+        self._slots.release()
+
+    # Borrow a connection; it is replaced instead of returned if its session expired
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
+            broken = is_session_expired(e)
+            raise
+        finally:
+            self._release(conn, broken)
+
+    # Run fn(cursor) on a pooled connection, retrying once on a fresh session if it expired
+    def _run(self, fn):
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    with conn.cursor() as cur:
+                        return fn(cur)
+            except Exception as e:
+                if attempt or not is_session_expired(e):
+                    raise
+
+    # Run fn(cursor) like _run, recording latency, row count and the Snowflake query id
+    def _observed(self, sql, fn, cache=None):
+        started = time.perf_counter()
+        query_ids = []
+        
+        def run(cur):
+            try:
+                return fn(cur)
+            finally:
+                query_ids.append(getattr(cur, "sfqid", None))
+        
+        result = None
+        error = None
+        try:
+            result = self._run(run)
+            return result
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.recorder.query(
+                sql, time.perf_counter() - started,
+                rows=_row_count(result),
+                cache=cache, sfqid=query_ids[-1] if query_ids else None, error=error
+            )
+
+    def _fetch(self, sql, params, cache=None):
+        def fetch(cur):
+            cur.execute(sql, params)
+            return cur.fetchall()
+        return self._observed(sql, fetch, cache)
+
+    # Fetch the executed query's result into a DataFrame. Snowflake cursors hand
+    # over Arrow batches, so no per-row Python objects are built and NUMBER
+    # columns arrive as int64/float64; other cursors fall back to fetchall().
+    def fetch_frame(self, cur):
+        columns = [column[0].lower() for column in cur.description]
+        fetch_batches = getattr(cur, "fetch_pandas_batches", None)
+        if fetch_batches is None:
+            return frame_from_rows(cur.fetchall(), columns)
+        import pandas as pd
+        batches = list(fetch_batches())
+        if not batches:
+            return pd.DataFrame(columns=columns)
+        frame = pd.concat(batches, ignore_index=True) if len(batches) > 1 else batches[0]
+        frame.columns = columns
+        return frame
+
+    def _fetch_frame(self, sql, params, columns, cache=None):
+        def fetch(cur):
+            cur.execute(sql, params)
+            frame = self.fetch_frame(cur)
+            if columns is not None:
+                frame.columns = list(columns)
+            return frame
+        return self._observed(sql, fetch, cache)
+
+    # Run a query with bind parameters and return all rows
+    def query(self, sql, params=None):
+        return self._fetch(sql, params)
+
+    # Run a query and return the result as a DataFrame with numeric dtypes.
+    # Columns are the lower-cased result column names unless `columns` renames them.
+    def query_frame(self, sql, params=None, columns=None):
+        return self._fetch_frame(sql, params, columns)
+
+    # Like query(), but served from the cache until a write touches one of its tables
+    def cached_query(self, sql, params=None):
+        key = (sql, tuple(params) if params is not None else None)
+        started = time.perf_counter()
+        hit, rows = self.cache.get(key)
+        if hit:
+            self.recorder.query(sql, time.perf_counter() - started, rows=len(rows), cache="hit")
+            return rows
+        tables = tables_in(sql)
+        generation = self.cache.generation(tables)
+        rows = self._fetch(sql, params, cache="miss")
+        self.cache.put(key, tables, generation, rows)
+        return rows
+
+    # Like query_frame(), cached the same way as cached_query(). Each call gets
+    # its own copy, so callers may modify the frame.
+    def cached_query_frame(self, sql, params=None, columns=None):
+        key = ("frame", sql, tuple(params) if params is not None else None,
+               tuple(columns) if columns is not None else None)
+        started = time.perf_counter()
+        hit, frame = self.cache.get(key)
+        if hit:
+            self.recorder.query(sql, time.perf_counter() - started, rows=len(frame), cache="hit")
+            return frame.copy()
+        tables = tables_in(sql)
+        generation = self.cache.generation(tables)
+        frame = self._fetch_frame(sql, params, columns, cache="miss")
+        self.cache.put(key, tables, generation, frame)
+        return frame.copy()
+
+    # Execute a statement with bind parameters and return the affected row count
+    def execute(self, sql, params=None):
+        def run(cur):
+            cur.execute(sql, params)
+            return self.affected_rows(cur)
+        try:
+            return self._observed(sql, run)
+        finally:
+            if is_write(sql):
+                self.cache.invalidate(tables_in(sql))
+
+    # Execute a statement once per parameter row in a single batch
+    def executemany(self, sql, rows):
+        def run(cur):
+            cur.executemany(sql, rows)
+            return self.affected_rows(cur)
+        try:
+            return self._observed(sql, run)
+        finally:
+            self.cache.invalidate(tables_in(sql))
+
+    # Rows affected by the last statement on a cursor
+    def affected_rows(self, cur):
+        return cur.rowcount
+
+    # Whether an error means another transaction wrote the same rows first.
+    # Snowflake queues concurrent DML on a table behind its lock instead of failing,
+    # so there the settlement's version check is what detects the conflict.
+    def is_write_conflict(self, error):
+        return False
+
+    # Bulk load rows into a fully qualified table on a transaction's cursor:
+    # one multi-row insert, or PUT + COPY INTO through the table stage for big loads
+    def bulk_insert(self, cur, table, columns, rows):
+        if not rows:
+            return
+        column_list = ", ".join(columns)
+        if len(rows) < STAGED_LOAD_THRESHOLD:
+            placeholders = ", ".join(["?"] * len(columns))
+            cur.executemany(f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})", rows)
+            return
+        
+        database, schema, name = table.split(".")
+        stage = f"@{database}.{schema}.%{name}"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, f"{name}_{time.time_ns()}.csv")
+            with open(path, "w", newline="") as f:
+                csv.writer(f).writerows(rows)
+            cur.execute(f"PUT 'file://{path}' {stage} AUTO_COMPRESS=TRUE")
+            cur.execute(f"""
+            COPY INTO {table} ({column_list})
+            FROM {stage}
+            FILES = ('{os.path.basename(path)}.gz')
+            FILE_FORMAT = (TYPE = CSV, FIELD_OPTIONALLY_ENCLOSED_BY = '"')
+            PURGE = TRUE
+            """)
+
+    # Next value of a sequence
+    def next_id(self, sequence):
+        return self.query(f"SELECT {sequence}.NEXTVAL")[0][0]
+
+    # Reserve `count` values of a sequence in one round-trip
+    def next_ids(self, sequence, count):
+        rows = self.query(f"SELECT {sequence}.NEXTVAL FROM TABLE(GENERATOR(ROWCOUNT => {int(count)}))")
+        return [row[0] for row in rows]
+
+    # Cursor whose statements commit together, or roll back if the block raises.
+    # Cached reads of every table written in the block are invalidated on commit.
+    # Losing a write-write race with another transaction raises WriteConflict.
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            with conn.cursor() as raw_cursor:
+                cur = _TrackingCursor(raw_cursor, self.recorder)
+                cur.execute("BEGIN")
+                try:
+                    yield cur
+                except Exception as e:
+                    cur.execute("ROLLBACK")
+                    if self.is_write_conflict(e):
+                        raise WriteConflict(str(e)) from e
+                    raise
+                try:
+                    cur.execute("COMMIT")
+                except Exception as e:
+                    if self.is_write_conflict(e):
+                        raise WriteConflict(str(e)) from e
+                    raise
+                finally:
+                    self.cache.invalidate(cur.written)
+
+    # Close every idle connection
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+# Account identifier from secrets, accepting a full https://<account>.snowflakecomputing.com URL
+def snowflake_account(raw_account):
+    if raw_account.startswith('https://'):
+        parsed_url = urlparse(raw_account)
+        return parsed_url.netloc.replace('.snowflakecomputing.com', '')
+    return raw_account
+
+
+# Connection pool for the [snowflake] settings used in secrets.toml
+def snowflake_pool(settings):
+    import snowflake.connector
+    # Bind parameters server-side with ? placeholders
+    snowflake.connector.paramstyle = 'qmark'
+    
+    def connect():
+        return snowflake.connector.connect(
+            user=settings["user"],
+            password=settings["password"],
+            account=snowflake_account(settings["account"]),
+            warehouse=settings.get("warehouse", "COMPUTE_WH"),
+            database=settings.get("database", "BOOTCAMP_RALLY"),
+            schema=settings.get("schema", "PUBLIC"),
+            role=settings.get("role", "SYSADMIN"),
+            client_session_keep_alive=True
+        )
+    
+    return ConnectionPool(connect, size=int(settings.get("pool_size", 4)))
+
+
+# Read the [snowflake] settings from a Streamlit secrets file, for scripts run outside Streamlit
+def load_secrets(path=".streamlit/secrets.toml"):
+    import tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)["snowflake"]
@@ -0,0 +1,135 @@
+import contextvars
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# When this process started loading the app, for cold-start timings
+PROCESS_STARTED = time.perf_counter()
+
+# Events kept in memory for the debug panel and exports
+MAX_EVENTS = 2000
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Request (one Streamlit script run, or one CLI command) the current thread is serving
+_current_request = contextvars.ContextVar("current_request", default=None)
+
+
+# SQL with literals and multi-row VALUES lists collapsed, so every run of the same
+# query shape shares one fingerprint
+def normalize_sql(sql):
+    sql = _LITERALS.sub("?", sql)
+    sql = _VALUE_LISTS.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+# In-memory ring buffer of query, page and stage timings
+class Recorder:
+    def __init__(self, max_events=MAX_EVENTS):
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, seconds, **fields):
+        request = _current_request.get()
+        event = {
+            "ts": time.time(),
+            "request_id": request["id"] if request else None,
+            "page": request["page"] if request else None,
+            "kind": kind,
+            "name": name,
+            "ms": round(seconds * 1000, 3),
+        }
+        event.update(fields)
+        with self._lock:
+            self._events.append(event)
+        return event
+
+    # Record a database statement
+    def query(self, sql, seconds, rows=None, cache=None, sfqid=None, error=None):
+        return self.record(
+            "query", fingerprint(sql), seconds,
+            sql=normalize_sql(sql)[:500], rows=rows, cache=cache, sfqid=sfqid, error=error
+        )
+
+    # Time the enclosed block as one event
+    @contextmanager
+    def span(self, kind, name, **fields):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - started, **fields)
+
+    # Mark the events recorded in this thread as belonging to a new request
+    def begin_request(self, page=None):
+        request = {"id": uuid.uuid4().hex[:12], "page": page}
+        _current_request.set(request)
+        return request
+
+    def set_page(self, page):
+        request = _current_request.get()
+        if request is not None:
+            request["page"] = page
+
+    def events(self, request_id=None):
+        with self._lock:
+            events = list(self._events)
+        if request_id is not None:
+            events = [event for event in events if event["request_id"] == request_id]
+        return events
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def to_jsonl(self, events=None):
+        events = self.events() if events is None else events
+        return "".join(json.dumps(event, default=str) + "\n" for event in events)
+
+    # Prometheus text exposition of the buffered events, aggregated per query
+    # fingerprint, page and race stage
+    def to_prometheus(self, events=None):
+        events = self.events() if events is None else events
+        series = {}
+
+        def add(metric, labels, value):
+            key = (metric, tuple(sorted(labels.items())))
+            series[key] = series.get(key, 0) + value
+
+        for event in events:
+            seconds = event["ms"] / 1000
+            if event["kind"] == "query":
+                labels = {"fingerprint": event["name"], "cache": event.get("cache") or "none"}
+                add("rally_query_seconds_sum", labels, seconds)
+                add("rally_query_seconds_count", labels, 1)
+                add("rally_query_rows_total", labels, event.get("rows") or 0)
+                if event.get("error"):
+                    add("rally_query_errors_total", labels, 1)
+            elif event["kind"] == "page":
+                add("rally_page_render_seconds_sum", {"page": event["name"]}, seconds)
+                add("rally_page_render_seconds_count", {"page": event["name"]}, 1)
+            else:
+                labels = {"kind": event["kind"], "name": event["name"]}
+                add("rally_span_seconds_sum", labels, seconds)
+                add("rally_span_seconds_count", labels, 1)
+
+        lines = []
+        for (metric, labels), value in sorted(series.items()):
+            label_text = ",".join(f'{name}="{label}"' for name, label in labels)
+            lines.append(f"{metric}{{{label_text}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide recorder shared by the pool, the race pipeline and the pages
+RECORDER = Recorder()
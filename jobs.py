@@ -0,0 +1,95 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs remembered for status polling; the oldest finished ones are forgotten first
+MAX_JOBS = 200
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+# One submitted job. The running function reports progress through update().
+class Job:
+    def __init__(self, key, description=None):
+        self.key = key
+        self.description = description
+        self.status = QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.detail = None
+        self.result = None
+        self.error = None
+        # Problems the job ran into without failing, for the page to show
+        self.warnings = []
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    # Report the current stage, the share of the work done and optionally a partial result
+    def update(self, stage, progress=None, detail=None):
+        self.stage = stage
+        if progress is not None:
+            self.progress = progress
+        if detail is not None:
+            self.detail = detail
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+
+# Background job runner. Jobs are submitted under an idempotency key: submitting
+# a key that is already known returns the existing job instead of running it twice,
+# so a double click or a rerun of the page cannot start the same race again.
+class JobQueue:
+    def __init__(self, workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rally-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Run fn(job, *args, **kwargs) in the background; its return value becomes job.result
+    def submit(self, key, fn, *args, description=None, **kwargs):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            job = Job(key, description)
+            self._jobs[key] = job
+            self._forget_old()
+        # Run in a copy of the caller's context so its instrumentation request carries over
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _forget_old(self):
+        excess = len(self._jobs) - MAX_JOBS
+        for key in [key for key, job in self._jobs.items() if job.finished][:max(excess, 0)]:
+            del self._jobs[key]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,40 @@
+import importlib
+import importlib.util
+import threading
+
+
+# Stand-in for a module that is imported on first attribute access, so heavy
+# dependencies (pandas, the Snowflake connector, NumPy) only load on the pages
+# that use them. importlib.import_module does the real import, so concurrent
+# first uses from several threads are safe.
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+# Whether a module can be imported, without importing it
+def is_available(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
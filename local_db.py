@@ -0,0 +1,167 @@
+import os
+import re
+
+import db
+import migrations
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+# Same tables as rally_schema.sql, in DuckDB's dialect; later changes are in
+# migrations/. Snowflake does not enforce foreign keys, so they are left out here as well.
+LOCAL_SCHEMA = """
+CREATE SCHEMA IF NOT EXISTS bootcamp_rally.teams;
+CREATE SCHEMA IF NOT EXISTS bootcamp_rally.cars;
+CREATE SCHEMA IF NOT EXISTS bootcamp_rally.races;
+
+CREATE SEQUENCE IF NOT EXISTS bootcamp_rally.teams.team_id_seq;
+CREATE SEQUENCE IF NOT EXISTS bootcamp_rally.cars.car_id_seq;
+CREATE SEQUENCE IF NOT EXISTS bootcamp_rally.races.race_id_seq;
+CREATE SEQUENCE IF NOT EXISTS bootcamp_rally.races.result_id_seq;
+
+CREATE TABLE IF NOT EXISTS bootcamp_rally.teams.teams (
+    team_id INTEGER DEFAULT nextval('bootcamp_rally.teams.team_id_seq') PRIMARY KEY,
+    team_name VARCHAR NOT NULL UNIQUE,
+    budget DECIMAL(12,2) DEFAULT 10000,
+    version INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bootcamp_rally.cars.cars (
+    car_id INTEGER DEFAULT nextval('bootcamp_rally.cars.car_id_seq') PRIMARY KEY,
+    team_id INTEGER,
+    model VARCHAR NOT NULL,
+    speed DECIMAL(5,0) NOT NULL,
+    horsepower DECIMAL(5,0) NOT NULL,
+    handling DECIMAL(3,0) NOT NULL,
+    durability DECIMAL(3,0) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bootcamp_rally.races.races (
+    race_id INTEGER DEFAULT nextval('bootcamp_rally.races.race_id_seq') PRIMARY KEY,
+    race_name VARCHAR NOT NULL,
+    track_length_km DECIMAL(6,2) DEFAULT 100,
+    track_type VARCHAR DEFAULT 'Gravel',
+    participation_fee DECIMAL(10,2) DEFAULT 1000,
+    prize_pool DECIMAL(12,2) DEFAULT 5000,
+    race_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bootcamp_rally.races.race_results (
+    result_id INTEGER DEFAULT nextval('bootcamp_rally.races.result_id_seq') PRIMARY KEY,
+    race_id INTEGER,
+    car_id INTEGER,
+    team_id INTEGER,
+    finish_time DECIMAL(8,2),
+    position INTEGER,
+    prize_awarded DECIMAL(10,2) DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS bootcamp_rally.races.team_standings (
+    team_id INTEGER PRIMARY KEY,
+    points INTEGER DEFAULT 0,
+    entries INTEGER DEFAULT 0,
+    finishes INTEGER DEFAULT 0,
+    wins INTEGER DEFAULT 0,
+    podiums INTEGER DEFAULT 0,
+    total_prize DECIMAL(14,2) DEFAULT 0,
+    total_finish_time DOUBLE DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bootcamp_rally.races.car_standings (
+    car_id INTEGER PRIMARY KEY,
+    points INTEGER DEFAULT 0,
+    entries INTEGER DEFAULT 0,
+    finishes INTEGER DEFAULT 0,
+    wins INTEGER DEFAULT 0,
+    podiums INTEGER DEFAULT 0,
+    total_prize DECIMAL(14,2) DEFAULT 0,
+    total_finish_time DOUBLE DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rally_schema.sql")
+
+
+# Sample-data INSERT statements from rally_schema.sql, so both backends start from the same rows
+def sample_data_statements(path=SCHEMA_FILE):
+    with open(path) as f:
+        script = f.read()
+    return [statement.strip() for statement in re.findall(r"INSERT INTO .*?;", script, re.DOTALL)]
+
+
+# Connection pool over a local DuckDB database that speaks the same SQL as the
+# app's Snowflake queries (bootcamp_rally.<schema>.<table> names, ? parameters).
+# path=":memory:" keeps everything in memory.
+class LocalPool(db.ConnectionPool):
+    is_local = True
+
+    def __init__(self, path=":memory:", size=4):
+        if not DUCKDB_AVAILABLE:
+            raise RuntimeError("duckdb is not installed. Run: pip install duckdb")
+        self.path = path
+        self._database = duckdb.connect()
+        self._database.execute(f"ATTACH '{path}' AS bootcamp_rally")
+        self._database.execute("USE bootcamp_rally")
+        super().__init__(self._database.cursor, size=size)
+
+    # Create the schema and apply pending migrations; with sample_data, also load
+    # the sample rows from rally_schema.sql
+    def create_schema(self, sample_data=False):
+        with self.connection() as conn:
+            conn.execute(LOCAL_SCHEMA)
+        migrations.migrate(self)
+        with self.connection() as conn:
+            if sample_data and not conn.execute("SELECT COUNT(*) FROM bootcamp_rally.teams.teams").fetchone()[0]:
+                for statement in sample_data_statements():
+                    conn.execute(statement)
+        self.cache.clear()
+        return self
+
+    # DuckDB reports the affected row count as the statement's result row
+    def affected_rows(self, cur):
+        try:
+            row = cur.fetchone()
+        except Exception:
+            return -1
+        return row[0] if row else 0
+
+    # DuckDB materializes results column by column, DECIMAL as float64
+    def fetch_frame(self, cur):
+        frame = cur.fetch_df()
+        frame.columns = [column.lower() for column in frame.columns]
+        return frame
+
+    # Load rows through a registered DataFrame, which is far faster than executemany in DuckDB
+    def bulk_insert(self, cur, table, columns, rows):
+        if not rows:
+            return
+        import pandas as pd
+        frame = pd.DataFrame(list(rows), columns=list(columns))
+        cur.register("bulk_rows", frame)
+        try:
+            column_list = ", ".join(columns)
+            cur.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM bulk_rows")
+        finally:
+            cur.unregister("bulk_rows")
+
+    # DuckDB fails the second of two transactions updating the same row
+    def is_write_conflict(self, error):
+        return isinstance(error, duckdb.TransactionException) and "conflict" in str(error).lower()
+
+    def next_id(self, sequence):
+        return self.query(f"SELECT nextval('{sequence}')")[0][0]
+
+    def next_ids(self, sequence, count):
+        rows = self.query(f"SELECT nextval('{sequence}') FROM range({int(count)})")
+        return [row[0] for row in rows]
+
+    def close(self):
+        super().close()
+        self._database.close()
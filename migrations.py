@@ -0,0 +1,90 @@
+import os
+import re
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+MIGRATIONS_TABLE = "bootcamp_rally.public.schema_migrations"
+
+# NNNN_name.sql runs on every backend; NNNN_name.<dialect>.sql only on that one
+_FILE_NAME = re.compile(r"^(\d+)_(\w+?)(?:\.(snowflake|duckdb))?\.sql$")
+
+
+def dialect(pool):
+    return "duckdb" if getattr(pool, "is_local", False) else "snowflake"
+
+
+# Migrations for a dialect as (version, name, path), oldest first
+def discover(dialect_name, directory=MIGRATIONS_DIR):
+    found = {}
+    for file_name in sorted(os.listdir(directory)):
+        match = _FILE_NAME.match(file_name)
+        if not match or match.group(3) not in (None, dialect_name):
+            continue
+        version = int(match.group(1))
+        if version in found:
+            raise ValueError(f"Two migrations numbered {version}: {found[version][2]} and {file_name}")
+        found[version] = (version, match.group(2), os.path.join(directory, file_name))
+    return [found[version] for version in sorted(found)]
+
+
+# {next_value:<table>:<column>} in a migration stands for one more than the
+# column's current maximum (1 for an empty table), e.g. to start a sequence
+# above the ids already in use
+_NEXT_VALUE = re.compile(r"\{next_value:([\w.]+):(\w+)\}")
+
+
+# Statements of a migration file, without comment lines
+def statements(path):
+    with open(path) as f:
+        lines = [line for line in f if not line.lstrip().startswith("--")]
+    return [statement.strip() for statement in "".join(lines).split(";") if statement.strip()]
+
+
+# Replace {next_value:...} placeholders with values read on the migration's cursor
+def _render(cur, statement):
+    def next_value(match):
+        cur.execute(f"SELECT COALESCE(MAX({match.group(2)}), 0) + 1 FROM {match.group(1)}")
+        return str(int(cur.fetchone()[0]))
+    return _NEXT_VALUE.sub(next_value, statement)
+
+
+def _ensure_table(pool):
+    pool.execute("CREATE SCHEMA IF NOT EXISTS bootcamp_rally.public")
+    pool.execute(f"""
+    CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+# Versions already applied, as {version: applied_at}
+def applied(pool):
+    _ensure_table(pool)
+    return dict(pool.query(f"SELECT version, applied_at FROM {MIGRATIONS_TABLE}"))
+
+
+# Apply pending migrations up to `target` (all by default), each in its own
+# transaction together with its schema_migrations row. Snowflake commits DDL as it
+# runs, so migrations are written to be safe to re-run (IF NOT EXISTS and the like).
+# Returns the (version, name) pairs applied.
+def migrate(pool, target=None):
+    done = applied(pool)
+    ran = []
+    for version, name, path in discover(dialect(pool)):
+        if version in done or (target is not None and version > target):
+            continue
+        with pool.transaction() as cur:
+            for statement in statements(path):
+                cur.execute(_render(cur, statement))
+            cur.execute(f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES (?, ?)", (version, name))
+        ran.append((version, name))
+    pool.cache.clear()
+    return ran
+
+
+# Every migration for the pool's backend with when it was applied (None if pending)
+def status(pool):
+    done = applied(pool)
+    return [(version, name, done.get(version)) for version, name, _ in discover(dialect(pool))]
@@ -0,0 +1,27 @@
+-- Databases created from rally_schema.sql before budgets were versioned or
+-- standings were kept
+ALTER TABLE bootcamp_rally.teams.teams ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS bootcamp_rally.races.team_standings (
+    team_id INTEGER PRIMARY KEY,
+    points INTEGER DEFAULT 0,
+    entries INTEGER DEFAULT 0,
+    finishes INTEGER DEFAULT 0,
+    wins INTEGER DEFAULT 0,
+    podiums INTEGER DEFAULT 0,
+    total_prize DECIMAL(14,2) DEFAULT 0,
+    total_finish_time DOUBLE DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bootcamp_rally.races.car_standings (
+    car_id INTEGER PRIMARY KEY,
+    points INTEGER DEFAULT 0,
+    entries INTEGER DEFAULT 0,
+    finishes INTEGER DEFAULT 0,
+    wins INTEGER DEFAULT 0,
+    podiums INTEGER DEFAULT 0,
+    total_prize DECIMAL(14,2) DEFAULT 0,
+    total_finish_time DOUBLE DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,6 @@
+-- DuckDB has no clustering keys; indexes on the same columns give the local
+-- database the same point lookups, so plan checks see the same access paths
+CREATE INDEX IF NOT EXISTS race_results_race_id ON bootcamp_rally.races.race_results (race_id);
+CREATE INDEX IF NOT EXISTS race_results_team_id ON bootcamp_rally.races.race_results (team_id);
+CREATE INDEX IF NOT EXISTS races_race_date ON bootcamp_rally.races.races (race_date);
+CREATE INDEX IF NOT EXISTS cars_team_id ON bootcamp_rally.cars.cars (team_id);
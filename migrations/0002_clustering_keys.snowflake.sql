@@ -0,0 +1,6 @@
+-- Cluster the hot tables on how the app reads them: results by race (race pages,
+-- archiving) then team (View Results team filter), races by date (history pages
+-- newest first, archiving by age), cars by team (every cars/teams join)
+ALTER TABLE bootcamp_rally.races.race_results CLUSTER BY (race_id, team_id);
+ALTER TABLE bootcamp_rally.races.races CLUSTER BY (race_date);
+ALTER TABLE bootcamp_rally.cars.cars CLUSTER BY (team_id);
@@ -0,0 +1,4 @@
+-- Race ids come from a sequence so the app can reserve an id before inserting
+-- the race row; it starts above the ids already used
+CREATE SEQUENCE IF NOT EXISTS bootcamp_rally.races.race_id_seq START {next_value:bootcamp_rally.races.races:race_id};
+ALTER TABLE bootcamp_rally.races.races ALTER COLUMN race_id SET DEFAULT nextval('bootcamp_rally.races.race_id_seq');
@@ -0,0 +1,24 @@
+-- Race ids come from a sequence so the app can reserve an id before inserting
+-- the race row. Databases created before that have AUTOINCREMENT race ids, so
+-- the sequence starts above the ids already used.
+CREATE SEQUENCE IF NOT EXISTS bootcamp_rally.races.race_id_seq START = {next_value:bootcamp_rally.races.races:race_id};
+-- Snowflake cannot change the default of an AUTOINCREMENT column, so the table
+-- is rebuilt with the sequence default and swapped in. Each step commits on its
+-- own; every one of them is safe to re-run if the migration stops part way.
+-- Races recorded between the copy and the swap would be lost, so run it while
+-- the app is stopped.
+CREATE OR REPLACE TABLE bootcamp_rally.races.races_rebuild (
+    race_id INTEGER DEFAULT bootcamp_rally.races.race_id_seq.NEXTVAL PRIMARY KEY,
+    race_name STRING NOT NULL,
+    track_length_km NUMBER(6,2) DEFAULT 100,
+    track_type STRING DEFAULT 'Gravel',
+    participation_fee NUMBER(10,2) DEFAULT 1000,
+    prize_pool NUMBER(12,2) DEFAULT 5000,
+    race_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) CLUSTER BY (race_date);
+INSERT INTO bootcamp_rally.races.races_rebuild
+    (race_id, race_name, track_length_km, track_type, participation_fee, prize_pool, race_date)
+SELECT race_id, race_name, track_length_km, track_type, participation_fee, prize_pool, race_date
+FROM bootcamp_rally.races.races;
+ALTER TABLE bootcamp_rally.races.races SWAP WITH bootcamp_rally.races.races_rebuild;
+DROP TABLE bootcamp_rally.races.races_rebuild;
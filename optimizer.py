@@ -0,0 +1,145 @@
+import itertools
+
+import numpy as np
+
+import race_engine
+
+# Levels per stat in the coarse grid the search starts from
+GRID_LEVELS = 11
+
+# Simulations used to rate the best setup against the field
+FIELD_SIMS = 20_000
+
+# Mean of 1 / random factor, so expected finish time = base time * this
+_LOW, _HIGH = race_engine.RANDOM_FACTOR_RANGE
+INVERSE_FACTOR_MEAN = np.log(_HIGH / _LOW) / (_HIGH - _LOW)
+
+_LOWS = np.asarray([race_engine.STAT_BOUNDS[column][0] for column in race_engine.STAT_COLUMNS], dtype=np.float64)
+_SPANS = np.asarray(
+    [race_engine.STAT_BOUNDS[column][1] - race_engine.STAT_BOUNDS[column][0] for column in race_engine.STAT_COLUMNS],
+    dtype=np.float64
+)
+
+
+# Share of each stat's slider range a setup uses, summed over the stats (0 to 4).
+# setups is an (n, 4) array in STAT_COLUMNS order.
+def allocation_cost(setups):
+    return ((np.asarray(setups, dtype=np.float64) - _LOWS) / _SPANS).sum(axis=-1)
+
+
+# Performance times track factor of each setup; the random factor divides it,
+# so a higher score always means a faster expected finish
+def setup_scores(setups, track_type):
+    setups = np.asarray(setups, dtype=np.float64)
+    grid = {column: setups[..., i] for i, column in enumerate(race_engine.STAT_COLUMNS)}
+    performance = race_engine.base_performance(grid["speed"], grid["horsepower"], grid["handling"], grid["durability"])
+    return performance * race_engine.track_factor(track_type, grid["handling"], grid["durability"])
+
+
+def expected_finish_time(score, track_length):
+    return float(track_length) * 1000 / score * INVERSE_FACTOR_MEAN
+
+
+# Per-stat (low, high) limits: the slider bounds, narrowed by `bounds` where given
+def _limits(bounds):
+    limits = []
+    for column in race_engine.STAT_COLUMNS:
+        low, high = race_engine.STAT_BOUNDS[column]
+        wanted_low, wanted_high = (bounds or {}).get(column, (low, high))
+        limits.append((max(low, wanted_low), min(high, wanted_high)))
+    return np.asarray(limits, dtype=np.float64)
+
+
+# Coarse-grid setups coordinate descent starts from: the best few, so a start
+# that settles on a local optimum along the budget boundary is outvoted
+DESCENT_STARTS = 8
+
+
+# Coordinate descent from one setup: trade stat points between pairs of stats (or
+# move one alone) with shrinking steps down to single units.
+# Returns the best setup found, its score and the number of setups evaluated.
+def _descend(best, best_score, track_type, budget, limits):
+    n_stats = len(race_engine.STAT_COLUMNS)
+    pairs = [(up, down) for up in range(n_stats) for down in range(n_stats) if up != down]
+    fraction = 1.0 / (GRID_LEVELS - 1)
+    evaluations = 0
+    while True:
+        # Moves of the same share of range: one stat up, one down, or one alone
+        step = np.maximum(np.round(fraction * _SPANS), 1)
+        moves = []
+        for up, down in pairs:
+            move = np.zeros(n_stats)
+            move[up] = step[up]
+            move[down] = -step[down]
+            moves.append(move)
+        for i in range(n_stats):
+            for sign in (1, -1):
+                move = np.zeros(n_stats)
+                move[i] = sign * step[i]
+                moves.append(move)
+        trials = np.clip(best + np.asarray(moves), limits[:, 0], limits[:, 1])
+        trials = trials[allocation_cost(trials) <= budget + 1e-9]
+        evaluations += len(trials)
+        if len(trials):
+            trial_scores = setup_scores(trials, track_type)
+            if trial_scores.max() > best_score * (1 + 1e-12):
+                best = trials[np.argmax(trial_scores)]
+                best_score = trial_scores.max()
+                continue
+        if (step <= 1).all():
+            break
+        fraction /= 2
+    return best, best_score, evaluations
+
+
+# Best stat setup for a track type: the lowest expected finish time whose
+# allocation_cost stays within `budget`, with each stat inside the slider bounds
+# (and `bounds`, a {stat: (low, high)} dict, where given). A vectorized pass over
+# a coarse grid picks the DESCENT_STARTS best setups; coordinate descent from each
+# refines them and the best result wins.
+# Returns the setup, its score, expected finish time, cost and the number of
+# setups evaluated, or None if no setup fits the budget.
+def optimize_setup(track_type, track_length, budget, bounds=None):
+    limits = _limits(bounds)
+    if (limits[:, 0] > limits[:, 1]).any():
+        raise ValueError("Each stat's minimum must not exceed its maximum")
+
+    levels = [np.unique(np.round(np.linspace(low, high, GRID_LEVELS))) for low, high in limits]
+    candidates = np.asarray(list(itertools.product(*levels)), dtype=np.float64)
+    candidates = candidates[allocation_cost(candidates) <= budget + 1e-9]
+    if not len(candidates):
+        return None
+    scores = setup_scores(candidates, track_type)
+    evaluations = len(candidates)
+
+    best, best_score = None, -np.inf
+    for start in np.argsort(scores)[::-1][:DESCENT_STARTS]:
+        setup, score, count = _descend(candidates[start], scores[start], track_type, budget, limits)
+        evaluations += count
+        if score > best_score:
+            best, best_score = setup, score
+
+    return {
+        "setup": {column: int(value) for column, value in zip(race_engine.STAT_COLUMNS, best)},
+        "score": float(best_score),
+        "expected_finish_time": expected_finish_time(best_score, track_length),
+        "cost": float(allocation_cost(best)),
+        "evaluations": evaluations,
+    }
+
+
+# Rate a setup against a field (a grid of the cars entering): Monte Carlo win and
+# podium probability, expected position and prize of the setup as an extra entrant
+def rate_against_field(setup, field_grid, track_type, track_length, prize_pool, n_sims=FIELD_SIMS, seed=None):
+    grid = {
+        column: np.append(np.asarray(field_grid[column], dtype=np.float64), float(setup[column]))
+        for column in race_engine.STAT_COLUMNS
+    }
+    forecast = race_engine.forecast_race(grid, track_type, track_length, prize_pool, n_sims=n_sims, seed=seed)
+    return {
+        "win": float(forecast["win"][-1]),
+        "podium": float(forecast["podium"][-1]),
+        "expected_position": float(forecast["expected_position"][-1]),
+        "expected_prize": float(forecast["expected_prize"][-1]),
+        "field_size": len(grid["speed"]),
+    }
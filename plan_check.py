@@ -0,0 +1,284 @@
+import ast
+import importlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+import instrumentation
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plan_baseline.json")
+
+# Data the check plans against: enough rows that the planner picks the plans a
+# real season would get, with a fixed seed so plans are the same on every run
+DATA = dict(teams=200, cars_per_team=2, races=50, history_races=400, entrants=40, seed=0)
+
+_STATEMENT = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|MERGE)\b")
+_COMPARED_COLUMN = re.compile(r"(\w+)\s*(?:=|<>|!=|<=|>=|<|>|\bLIKE)\s*$", re.IGNORECASE)
+_INSERT = re.compile(r"INSERT\s+INTO\s+([\w.]+)\s*\(([^)]*)\)\s*VALUES\s*\(", re.IGNORECASE)
+
+# Hot tables: a full scan of one of these is always reported unless the query is in
+# ACCEPTED_FULL_SCANS
+HOT_TABLES = ("bootcamp_rally.races.race_results", "bootcamp_rally.races.races")
+
+# Full scans of hot tables that are part of what a query does, with the reason.
+# A template's entry covers all of its variants.
+ACCEPTED_FULL_SCANS = {
+    "RACES_QUERY": "lists every race for the race pickers",
+    "season.CALENDAR_QUERY": "finds the races without results among all races",
+    "HISTORY_RACES_QUERY": "picks a page's races, one row per race, before any results are read",
+}
+
+# Sample values bound to parameters, by column type
+_SAMPLES = {
+    "INTEGER": 1, "BIGINT": 1, "DOUBLE": 1.0, "VARCHAR": "Sample",
+    "TIMESTAMP": datetime(2025, 1, 1), "DATE": datetime(2025, 1, 1).date(),
+}
+
+
+# SQL statements app.py runs, as (label, sql): string literals that are statements,
+# and the *_QUERY constants of modules it uses. Templates with a {where}
+# placeholder are returned as they are; see history_statements.
+def app_queries(path=APP_FILE):
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    names = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            names[id(node.value)] = node.targets[0].id
+    in_f_strings = {id(part) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for part in node.values}
+
+    queries = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in in_f_strings
+                and _STATEMENT.match(node.value)):
+            queries.append((names.get(id(node), f"app.py:{node.lineno}"), node.value))
+        elif (isinstance(node, ast.Attribute) and node.attr.endswith("_QUERY")
+                and isinstance(node.value, ast.Name)):
+            module = importlib.import_module(node.value.id)
+            queries.append((f"{node.value.id}.{node.attr}", getattr(module, node.attr)))
+    unique = {}
+    for label, sql in sorted(queries, key=lambda query: query[0]):
+        unique.setdefault(instrumentation.fingerprint(sql), (label, sql))
+    return sorted(unique.values(), key=lambda query: query[0])
+
+
+def _column_types(pool):
+    rows = pool.query("""
+    SELECT table_schema, table_name, column_name, data_type FROM information_schema.columns
+    WHERE table_catalog = 'bootcamp_rally'
+    """)
+    by_column = {}
+    by_table = {}
+    for schema, table, column, data_type in rows:
+        base = data_type.split("(")[0]
+        by_column.setdefault(column, base)
+        by_table[(f"bootcamp_rally.{schema}.{table}", column)] = base
+    return by_column, by_table
+
+
+# A sample value for every ? in a statement, typed after the column it is compared
+# with or inserted into, so the planner sees realistic filters
+def sample_params(sql, column_types):
+    by_column, by_table = column_types
+    insert = _INSERT.search(sql)
+    insert_columns = [column.strip() for column in insert.group(2).split(",")] if insert else []
+    params = []
+    for match in re.finditer(r"\?", sql):
+        before = sql[:match.start()]
+        if insert and match.start() > insert.end() - 1 and len(params) < len(insert_columns):
+            data_type = by_table.get((insert.group(1), insert_columns[len(params)]))
+        elif re.search(r"\bLIMIT\s*$", before, re.IGNORECASE):
+            params.append(50)
+            continue
+        else:
+            compared = _COMPARED_COLUMN.search(before)
+            data_type = by_column.get(compared.group(1).lower()) if compared else None
+        params.append(_SAMPLES.get(data_type, 1))
+    return params
+
+
+def _walk(node):
+    yield node
+    for child in node.get("children", []):
+        yield from _walk(child)
+
+
+# Plan of a statement as its operator shape (one entry per operator, scans with
+# their table and whether they filter) and the tables it scans in full
+def plan(pool, sql, params):
+    rows = pool.query(f"EXPLAIN (FORMAT json) {sql}", params)
+    shape = []
+    full_scans = []
+    for root in json.loads(rows[0][1]):
+        for node in _walk(root):
+            info = node.get("extra_info", {})
+            table = info.get("Table")
+            entry = node["name"]
+            if table:
+                entry += f"({table}{', filtered' if 'Filters' in info else ''})"
+                # Dynamic filters are only known at run time and may not prune
+                # anything, so they do not count. Optional IN lists do: they are
+                # constants checked against zone maps, like a range filter.
+                filters = info.get("Filters", "")
+                filters = filters if isinstance(filters, list) else [filters]
+                if node["name"] == "SEQ_SCAN" and all(
+                    not condition or condition.startswith("optional: Dynamic Filter") for condition in filters
+                ):
+                    full_scans.append(table)
+            shape.append(entry)
+    return {"shape": shape, "full_scans": sorted(set(full_scans))}
+
+
+# Schema (after migrations) and data to plan against, in memory
+def check_pool():
+    import datagen
+    import local_db
+    pool = local_db.LocalPool(":memory:").create_schema(sample_data=True)
+    datagen.generate(pool, **DATA)
+    return pool
+
+
+# Filters View Results pages are read with, as {variant: get_race_history
+# arguments}, with values taken from the data so every filter matches rows:
+# the first page, a later page (keyset cursor) and each filter
+def history_variants(pool):
+    import app
+    count = pool.query("SELECT COUNT(*) FROM bootcamp_rally.races.race_results")[0][0]
+    race_date, race_id, position, race_name, team_id = pool.query("""
+    SELECT r.race_date, r.race_id, rr.position, r.race_name, rr.team_id
+    FROM bootcamp_rally.races.race_results rr
+    JOIN bootcamp_rally.races.races r ON rr.race_id = r.race_id
+    ORDER BY r.race_date DESC, r.race_id DESC, rr.position
+    LIMIT 1 OFFSET ?
+    """, (count // 2,))[0]
+    after = (race_date, race_id, position)
+    return {
+        "first page": {},
+        "later page": {"after": after},
+        "team": {"team_id": team_id},
+        "team, later page": {"team_id": team_id, "after": after},
+        "race": {"race_name": race_name},
+        "track type": {"track_type": "Snow"},
+        "dates": {"date_from": (race_date - timedelta(days=30)).date(), "date_to": race_date.date()},
+        "dates, later page": {"date_from": (race_date - timedelta(days=30)).date(), "date_to": race_date.date(),
+                              "after": after},
+    }, app
+
+
+# Statements a recorded race writes besides its inserts: the budget settlement
+# and both standings merges, for two teams and cars that have results
+def write_statements(pool):
+    import settlement
+    import standings
+    teams = pool.query("""
+    SELECT t.team_id, t.version, MIN(rr.car_id)
+    FROM bootcamp_rally.teams.teams t
+    JOIN bootcamp_rally.races.race_results rr ON rr.team_id = t.team_id
+    GROUP BY t.team_id, t.version
+    ORDER BY t.team_id
+    LIMIT 2
+    """)
+    changes = {team_id: -1000.0 for team_id, _, _ in teams}
+    versions = {team_id: version for team_id, version, _ in teams}
+    delta = [25, 1, 1, 1, 1, 1000.0, 3600.0]
+    return [
+        ("settlement.budget_settlement_statement", *settlement.budget_settlement_statement(changes, versions)),
+        ("standings.merge_statement[team]", *standings.merge_statement("team", {team_id: delta for team_id in changes})),
+        ("standings.merge_statement[car]", *standings.merge_statement("car", {car_id: delta for _, _, car_id in teams})),
+    ]
+
+
+# The statements one View Results page runs for a set of filters, as (label, sql,
+# params): the races of the page, then their results. Like get_race_history,
+# batches of races without results (calendar races) are skipped, so the plans
+# are those of the batch the page is read from.
+def history_statements(pool, app, filters):
+    after = filters.get("after")
+    race_filters = {name: value for name, value in filters.items() if name != "after"}
+    start = after[:2] if after else None
+    inclusive = True
+    while True:
+        races_sql, races_params = app.history_races_statement(
+            app.HISTORY_PAGE_SIZE + 2, start, inclusive, **race_filters
+        )
+        races = pool.query(races_sql, races_params)
+        results_sql, results_params = app.history_results_statement(
+            [race_id for race_id, _ in races], app.HISTORY_PAGE_SIZE + 1, after, filters.get("team_id")
+        )
+        if len(races) < app.HISTORY_PAGE_SIZE + 2 or pool.query(results_sql, results_params):
+            break
+        start, inclusive = (races[-1][1], races[-1][0]), False
+    return [("HISTORY_RACES_QUERY", races_sql, races_params), ("HISTORY_QUERY", results_sql, results_params)]
+
+
+# Every statement to plan as (label, sql, params): app.py's queries, the history
+# templates once per variant, and the race write path
+def statements_to_plan(pool):
+    column_types = _column_types(pool)
+    statements = []
+    for label, sql in app_queries():
+        if "{where}" not in sql:
+            statements.append((label, sql, sample_params(sql, column_types)))
+    variants, app = history_variants(pool)
+    for variant, filters in variants.items():
+        for label, sql, params in history_statements(pool, app, filters):
+            statements.append((f"{label}[{variant}]", sql, params))
+    return statements + write_statements(pool)
+
+
+# Plans of every statement, keyed by fingerprint
+def current_plans(pool):
+    plans = {}
+    for label, sql, params in statements_to_plan(pool):
+        try:
+            entry = plan(pool, sql, params)
+        except Exception as e:
+            entry = {"error": str(e).splitlines()[0]}
+        plans[instrumentation.fingerprint(sql)] = dict(label=label, **entry)
+    return plans
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(plans, path=BASELINE_FILE):
+    with open(path, "w") as f:
+        json.dump(plans, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+# Compare plans with the baseline. Returns (label, problem) pairs: plans that
+# changed, full scans of hot tables not in ACCEPTED_FULL_SCANS, other full scans the
+# baseline does not have, and queries that are new or can no longer be planned. Queries that only Snowflake can plan stay as errors in
+# the baseline and are not reported.
+def compare(plans, baseline):
+    problems = []
+    for key, current in sorted(plans.items(), key=lambda item: item[1]["label"]):
+        label = current["label"]
+        accepted = baseline.get(key)
+        hot_scans = [table for table in current.get("full_scans", []) if table in HOT_TABLES]
+        if hot_scans and label.split("[")[0] not in ACCEPTED_FULL_SCANS:
+            problems.append((label, f"full scan of {', '.join(hot_scans)}"))
+        if accepted is None:
+            problems.append((label, "new query, not in the baseline"))
+        elif "error" in current:
+            if "error" not in accepted:
+                problems.append((label, f"can no longer be planned: {current['error']}"))
+        elif "error" in accepted:
+            problems.append((label, "planned now but an error in the baseline"))
+        else:
+            new_scans = sorted(set(current["full_scans"]) - set(accepted["full_scans"]) - set(hot_scans))
+            if new_scans:
+                problems.append((label, f"new full scan of {', '.join(new_scans)}"))
+            if current["shape"] != accepted["shape"]:
+                problems.append((label, f"plan changed: {' > '.join(current['shape'])}"))
+    for key in sorted(set(baseline) - set(plans)):
+        problems.append((baseline[key]["label"], "in the baseline but no longer in app.py"))
+    return problems
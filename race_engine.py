@@ -0,0 +1,306 @@
+import numpy as np
+
+# Weights applied to speed, horsepower, handling and durability
+PERFORMANCE_WEIGHTS = (0.3, 0.2, 0.3, 0.2)
+
+# Random factor range applied to every car's performance
+RANDOM_FACTOR_RANGE = (0.8, 1.2)
+
+# Share of the prize pool for each paid position (top 4 get prizes)
+PRIZE_DISTRIBUTION = (0.4, 0.3, 0.2, 0.1)
+
+# Stat columns in the order the engine expects them
+STAT_COLUMNS = ("speed", "horsepower", "handling", "durability")
+
+# Allowed range of each stat, as offered by the Manage Cars sliders
+STAT_BOUNDS = {
+    "speed": (1, 500),
+    "horsepower": (1, 2000),
+    "handling": (1, 100),
+    "durability": (1, 100),
+}
+
+
+# Create a random generator from a seed (or pass an existing generator through)
+def make_rng(seed=None):
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+# Load participant stats into float arrays, one array per stat
+def load_grid(participants):
+    count = len(participants)
+    grid = {}
+    for column in STAT_COLUMNS:
+        grid[column] = np.fromiter((float(car[column]) for car in participants), dtype=np.float64, count=count)
+    return grid
+
+
+# Base performance based on car characteristics
+def base_performance(speed, horsepower, handling, durability):
+    w_speed, w_hp, w_handling, w_durability = PERFORMANCE_WEIGHTS
+    return speed * w_speed + horsepower * w_hp + handling * w_handling + durability * w_durability
+
+
+# Adjust for track type: Snow rewards handling, Gravel rewards durability
+def track_factor(track_type, handling, durability):
+    if track_type == 'Snow':
+        return handling / 100
+    if track_type == 'Gravel':
+        return durability / 100
+    return np.ones_like(np.asarray(handling, dtype=np.float64))
+
+
+# Draw the per-car random factors (0.8 to 1.2)
+def draw_random_factors(count, seed=None):
+    low, high = RANDOM_FACTOR_RANGE
+    return make_rng(seed).uniform(low, high, size=count)
+
+
+# Calculate finish times (lower is better) for the whole grid in one pass
+def score_grid(grid, track_type, track_length, seed=None, random_factors=None):
+    speed = np.asarray(grid["speed"], dtype=np.float64)
+    if random_factors is None:
+        random_factors = draw_random_factors(speed.shape[-1], seed)
+    performance = base_performance(speed, grid["horsepower"], grid["handling"], grid["durability"])
+    factor = track_factor(track_type, grid["handling"], grid["durability"])
+    return (float(track_length) * 1000) / (performance * factor * random_factors)
+
+
+# Finishing order as indices into the grid (stable, so ties keep grid order)
+def rank_grid(finish_times):
+    return np.argsort(finish_times, kind="stable")
+
+
+# Segment-level simulation: per-sector noise around each car's race-day form
+SECTOR_NOISE_RANGE = (0.95, 1.05)
+
+# Condition lost per km by a car with durability 0; durability shields up to
+# DURABILITY_PROTECTION of it
+WEAR_PER_KM = 0.004
+DURABILITY_PROTECTION = 0.9
+
+# Share of its pace a completely worn car keeps
+WORN_PERFORMANCE = 0.5
+
+# Retirement hazard per km of a completely worn car (a fresh car never retires)
+DNF_RATE_PER_KM = 0.01
+
+# Sectors simulated per block, which bounds the size of the temporaries
+SEGMENT_BLOCK = 256
+
+
+# Simulate a race sector by sector. The track is split into n_sectors equal
+# sectors; track_type is one surface for the whole race or a sequence with one
+# surface per sector. Cars wear as they go (less with high durability), run
+# slower when worn and may retire, with a hazard that grows with wear.
+# Split times go into a float32 (cars x sectors) buffer, `out` if given (for
+# example a memory-mapped file), filled block by block. Sectors from the one
+# a car retired in onwards are NaN.
+# Returns a dict with splits, finish_times (inf for retired cars),
+# dnf_sector (-1 for finishers) and sector_km.
+def simulate_segments(grid, track_type, track_length, n_sectors, seed=None, out=None):
+    rng = make_rng(seed)
+    speed = np.asarray(grid["speed"], dtype=np.float64)
+    n_cars = speed.shape[0]
+    sector_types = [track_type] * n_sectors if isinstance(track_type, str) else list(track_type)
+    if len(sector_types) != n_sectors:
+        raise ValueError(f"Expected {n_sectors} sector track types, got {len(sector_types)}")
+    sector_km = float(track_length) / n_sectors
+
+    # Race-day form, drawn once per car like the single-pass model
+    form = base_performance(speed, grid["horsepower"], grid["handling"], grid["durability"])
+    form = (form * draw_random_factors(n_cars, rng)).astype(np.float32)
+    durability = np.asarray(grid["durability"], dtype=np.float64)
+    wear_rate = (WEAR_PER_KM * (1 - durability / 100 * DURABILITY_PROTECTION)).astype(np.float32)
+
+    # One row of track factors per surface, picked per sector
+    surfaces = sorted(set(sector_types))
+    factors = np.stack([
+        np.broadcast_to(track_factor(surface, grid["handling"], grid["durability"]), (n_cars,))
+        for surface in surfaces
+    ]).astype(np.float32)
+    surface_index = np.asarray([surfaces.index(surface) for surface in sector_types])
+
+    splits = out if out is not None else np.empty((n_cars, n_sectors), dtype=np.float32)
+    dnf_sector = np.full(n_cars, -1, dtype=np.int32)
+    noise_low, noise_high = SECTOR_NOISE_RANGE
+    for start in range(0, n_sectors, SEGMENT_BLOCK):
+        stop = min(start + SEGMENT_BLOCK, n_sectors)
+        shape = (n_cars, stop - start)
+        # Wear accumulated before each sector starts
+        covered = np.arange(start, stop, dtype=np.float32) * np.float32(sector_km)
+        worn = np.minimum(wear_rate[:, None] * covered[None, :], np.float32(1))
+        pace = form[:, None] * factors[surface_index[start:stop]].T
+        pace *= np.float32(1) - np.float32(1 - WORN_PERFORMANCE) * worn
+        pace *= rng.random(shape, dtype=np.float32) * np.float32(noise_high - noise_low) + np.float32(noise_low)
+        np.divide(np.float32(sector_km * 1000), pace, out=splits[:, start:stop])
+
+        failed = rng.random(shape, dtype=np.float32) < np.float32(DNF_RATE_PER_KM * sector_km) * worn
+        retiring = failed.any(axis=1) & (dnf_sector < 0)
+        dnf_sector[retiring] = start + failed[retiring].argmax(axis=1)
+
+    retired = dnf_sector >= 0
+    if retired.any():
+        rows = np.flatnonzero(retired)
+        after = np.arange(n_sectors)[None, :] >= dnf_sector[rows, None]
+        splits[rows] = np.where(after, np.float32(np.nan), splits[rows])
+    finish_times = splits.sum(axis=1, dtype=np.float64)
+    finish_times[retired] = np.inf
+    return {
+        "splits": splits,
+        "finish_times": finish_times,
+        "dnf_sector": dnf_sector,
+        "sector_km": sector_km,
+    }
+
+
+# Classification of a segment race as indices into the grid: finishers by time,
+# then retired cars by distance covered (ties keep grid order)
+def rank_segments(race):
+    n_sectors = race["splits"].shape[1]
+    completed = np.where(race["dnf_sector"] < 0, n_sectors, race["dnf_sector"])
+    return np.lexsort((-completed, race["finish_times"]))
+
+# Cars whose team can pay the participation fee, charging each car of a team
+# against the team's remaining budget. Roster rows start with (car_id, team_id,
+# team_name, model, speed, horsepower, handling, durability, budget) with float
+# stats; any further fields are ignored. If team_budgets is given it overrides the roster budgets and the fees
+# are charged to it in place.
+def select_participants(roster, fee, team_budgets=None):
+    if team_budgets is None:
+        team_budgets = {}
+    participants = []
+    for car in roster:
+        car_id, team_id, team_name, model, speed, hp, handling, durability, budget = car[:9]
+        
+        remaining = team_budgets.setdefault(team_id, budget)
+        if remaining >= fee:
+            participants.append({
+                'car_id': car_id,
+                'team_id': team_id,
+                'team_name': team_name,
+                'model': model,
+                'speed': speed,
+                'horsepower': hp,
+                'handling': handling,
+                'durability': durability,
+                'budget': budget
+            })
+            team_budgets[team_id] = remaining - fee
+    return participants
+
+
+# Net budget change per team: participation fees charged minus prizes won
+def budget_changes(entrant_team_ids, prizes, fee):
+    changes = {}
+    for team_id in entrant_team_ids:
+        changes[team_id] = changes.get(team_id, 0.0) - fee
+    for team_id, prize in prizes:
+        changes[team_id] = changes.get(team_id, 0.0) + prize
+    return changes
+
+# Simulated races held in memory at once by the forecaster (cars x races)
+FORECAST_CHUNK_CELLS = 2_000_000
+
+
+# Monte Carlo forecast of one race: finishing position distribution, win and
+# podium probabilities and expected prize for every car in the grid. Each
+# simulated race uses exactly the simulate_race formula with fresh random factors.
+def forecast_race(grid, track_type, track_length, prize_pool, n_sims=100_000, seed=None):
+    rng = make_rng(seed)
+    # Everything except the random factor is fixed per car
+    base_times = score_grid(grid, track_type, track_length, random_factors=1.0)
+    n_cars = base_times.shape[0]
+    position_counts = np.zeros(n_cars * n_cars, dtype=np.int64)
+    car_offsets = np.arange(n_cars) * n_cars
+    chunk = max(1, FORECAST_CHUNK_CELLS // max(n_cars, 1))
+    
+    done = 0
+    while done < n_sims:
+        size = min(chunk, n_sims - done)
+        finish_times = base_times / draw_random_factors((size, n_cars), rng)
+        order = np.argsort(finish_times, axis=1)
+        positions = np.empty_like(order)
+        np.put_along_axis(positions, order, np.arange(n_cars), axis=1)
+        position_counts += np.bincount((positions + car_offsets).ravel(), minlength=n_cars * n_cars)
+        done += size
+    
+    probabilities = position_counts.reshape(n_cars, n_cars) / n_sims
+    paid = min(n_cars, len(PRIZE_DISTRIBUTION))
+    prizes = np.asarray(PRIZE_DISTRIBUTION[:paid]) * prize_pool
+    return {
+        "position_probabilities": probabilities,
+        "win": probabilities[:, 0],
+        "podium": probabilities[:, :3].sum(axis=1),
+        "expected_position": probabilities @ np.arange(1, n_cars + 1),
+        "expected_prize": probabilities[:, :paid] @ prizes,
+    }
+
+
+def _forecast_race_args(args):
+    return forecast_race(*args)
+
+
+# Forecast several races, each given as (grid, track_type, track_length, prize_pool).
+# workers=1 runs in-process; otherwise races are spread over a process pool.
+def forecast_races(races, n_sims=100_000, seed=None, workers=None):
+    seeds = np.random.SeedSequence(seed).spawn(len(races))
+    jobs = [(*race, n_sims, np.random.default_rng(race_seed)) for race, race_seed in zip(races, seeds)]
+    if workers == 1 or len(jobs) <= 1:
+        return [forecast_race(*job) for job in jobs]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_forecast_race_args, jobs))
+
+
+# Championship points for positions 1-10
+CHAMPIONSHIP_POINTS = (25, 18, 15, 12, 10, 8, 6, 4, 2, 1)
+
+
+def points_for(position):
+    if 1 <= position <= len(CHAMPIONSHIP_POINTS):
+        return CHAMPIONSHIP_POINTS[position - 1]
+    return 0
+
+
+# Standings delta of one race, keyed by `key` ('team_id' or 'car_id'):
+# [points, entries, finishes, wins, podiums, prize, total finish time].
+# Finish times are rounded like race_results stores them, so a rebuild from
+# history gives the same totals.
+def standings_delta(results, key):
+    delta = {}
+    for result in results:
+        row = delta.setdefault(result[key], [0, 0, 0, 0, 0, 0.0, 0.0])
+        position = result['position']
+        row[0] += points_for(position)
+        row[1] += 1
+        if result['finish_time'] is not None:
+            row[2] += 1
+            row[6] += round(result['finish_time'], 2)
+        row[3] += position == 1
+        row[4] += position <= 3
+        row[5] += result['prize']
+    return delta
+
+
+def _score_grid_args(args):
+    return score_grid(*args)
+
+
+# Finish times of the whole grid in each of several races, given as
+# (track_type, track_length). Each race draws from its own seeded stream, so
+# races can be scored independently; workers=1 runs in-process, otherwise the
+# races are spread over a process pool.
+def score_races(grid, races, seed=None, workers=None):
+    seeds = np.random.SeedSequence(seed).spawn(len(races))
+    jobs = [(grid, track_type, track_length, np.random.default_rng(race_seed))
+            for (track_type, track_length), race_seed in zip(races, seeds)]
+    if workers == 1 or len(jobs) <= 1:
+        return [score_grid(*job) for job in jobs]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_score_grid_args, jobs))
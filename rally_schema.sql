@@ -1,3 +1,6 @@
+-- Initial schema and sample data. Later schema changes live in migrations/;
+-- run python cli.py migrate after this script and after every upgrade.
+
 -- Create database
 CREATE DATABASE IF NOT EXISTS bootcamp_rally;
 
@@ -12,6 +15,8 @@ CREATE OR REPLACE TABLE bootcamp_rally.teams.teams (
     team_id INTEGER AUTOINCREMENT PRIMARY KEY,
     team_name STRING NOT NULL UNIQUE,
     budget NUMBER(12,2) DEFAULT 10000,
+    -- Bumped on every budget change; settlements compare-and-swap on it
+    version INTEGER DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 -- CARS schema
@@ -27,8 +32,11 @@ CREATE OR REPLACE TABLE bootcamp_rally.cars.cars (
 );
 
 -- RACES schema
+-- Race ids come from a sequence so the app can reserve an id before inserting the race row
+CREATE OR REPLACE SEQUENCE bootcamp_rally.races.race_id_seq;
+
 CREATE OR REPLACE TABLE bootcamp_rally.races.races (
-    race_id INTEGER AUTOINCREMENT PRIMARY KEY,
+    race_id INTEGER DEFAULT bootcamp_rally.races.race_id_seq.NEXTVAL PRIMARY KEY,
     race_name STRING NOT NULL,
     track_length_km NUMBER(6,2) DEFAULT 100,
     track_type STRING DEFAULT 'Gravel', -- Asphalt, Snow
@@ -47,6 +55,32 @@ CREATE OR REPLACE TABLE bootcamp_rally.races.race_results (
     prize_awarded NUMBER(10,2) DEFAULT 0
 );
 
+-- Championship standings, updated with each race's delta when results are written
+-- (python cli.py rebuild-standings recomputes them from race_results)
+CREATE OR REPLACE TABLE bootcamp_rally.races.team_standings (
+    team_id INTEGER PRIMARY KEY REFERENCES bootcamp_rally.teams.teams(team_id),
+    points INTEGER DEFAULT 0,
+    entries INTEGER DEFAULT 0,
+    finishes INTEGER DEFAULT 0,
+    wins INTEGER DEFAULT 0,
+    podiums INTEGER DEFAULT 0,
+    total_prize NUMBER(14,2) DEFAULT 0,
+    total_finish_time FLOAT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE TABLE bootcamp_rally.races.car_standings (
+    car_id INTEGER PRIMARY KEY REFERENCES bootcamp_rally.cars.cars(car_id),
+    points INTEGER DEFAULT 0,
+    entries INTEGER DEFAULT 0,
+    finishes INTEGER DEFAULT 0,
+    wins INTEGER DEFAULT 0,
+    podiums INTEGER DEFAULT 0,
+    total_prize NUMBER(14,2) DEFAULT 0,
+    total_finish_time FLOAT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Insert sample teams (team names and budget generated using AI)
 INSERT INTO bootcamp_rally.teams.teams (team_name, budget) VALUES
 ('Red Bull Racing', 150000.00),
@@ -0,0 +1,158 @@
+import decimal
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import db
+import race_engine
+import settlement
+import standings
+
+# Calendar races are the ones without results of their own
+CALENDAR_QUERY = """
+SELECT r.race_id, r.race_name, r.track_length_km, r.track_type, r.participation_fee, r.prize_pool
+FROM bootcamp_rally.races.races r
+WHERE NOT EXISTS (SELECT 1 FROM bootcamp_rally.races.race_results rr WHERE rr.race_id = r.race_id)
+ORDER BY r.race_id
+"""
+
+ROSTER_QUERY = """
+SELECT c.car_id, t.team_id, t.team_name, c.model, c.speed, c.horsepower, c.handling, c.durability, t.budget, t.version
+FROM bootcamp_rally.cars.cars c
+JOIN bootcamp_rally.teams.teams t ON c.team_id = t.team_id
+ORDER BY c.car_id
+"""
+
+ROSTER_COLUMNS = ("car_id", "team_id", "team_name", "model") + race_engine.STAT_COLUMNS + ("budget", "version")
+RACE_COLUMNS = ("race_id", "race_name", "track_length_km", "track_type", "participation_fee", "prize_pool", "race_date")
+RESULT_COLUMNS = ("race_id", "car_id", "team_id", "finish_time", "position", "prize_awarded")
+
+
+def _to_float(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+# Calendar races to run: the given race ids in order, or every race that has no results of its own
+def load_calendar(pool, race_ids=None):
+    if race_ids:
+        placeholders = ", ".join(["?"] * len(race_ids))
+        rows = pool.query(f"""
+        SELECT race_id, race_name, track_length_km, track_type, participation_fee, prize_pool
+        FROM bootcamp_rally.races.races
+        WHERE race_id IN ({placeholders})
+        """, tuple(race_ids))
+        by_id = {row[0]: row for row in rows}
+        missing = [race_id for race_id in race_ids if race_id not in by_id]
+        if missing:
+            raise ValueError(f"Races not found: {', '.join(map(str, missing))}")
+        rows = [by_id[race_id] for race_id in race_ids]
+    else:
+        rows = pool.query(CALENDAR_QUERY)
+    return [[_to_float(value) for value in row] for row in rows]
+
+
+# Simulate a whole calendar in one job. The roster is read once, every car is
+# scored in every race up front (in parallel across races when workers allows),
+# then the races are settled in order with team budgets carried forward in
+# memory so fee eligibility matches running them one by one. Everything is
+# written at the end in a single transaction of a few bulk statements; if a
+# team's budget changed meanwhile, the season is re-run from the new budgets.
+# Returns a list of (race, results) in calendar order; races nobody could
+# afford have empty results.
+def run_season(pool, race_ids=None, seed=None, workers=None):
+    calendar = load_calendar(pool, race_ids)
+    if not calendar:
+        return []
+    for attempt in range(settlement.MAX_ATTEMPTS):
+        try:
+            return _run_season(pool, calendar, seed, workers)
+        except db.WriteConflict:
+            if attempt == settlement.MAX_ATTEMPTS - 1:
+                raise
+
+
+def _run_season(pool, calendar, seed, workers):
+    roster_frame = pool.query_frame(ROSTER_QUERY, columns=ROSTER_COLUMNS)
+    if roster_frame.empty:
+        raise ValueError("No cars registered.")
+    roster = list(roster_frame.itertuples(index=False, name=None))
+
+    # Scoring does not depend on who can afford to enter, so it can all run up front
+    grid = {column: roster_frame[column].to_numpy(dtype=np.float64) for column in race_engine.STAT_COLUMNS}
+    finish_times = race_engine.score_races(
+        grid, [(race[3], race[2]) for race in calendar], seed=seed, workers=workers
+    )
+    roster_index = {car[0]: i for i, car in enumerate(roster)}
+
+    team_budgets = {}
+    versions = {}
+    for car in roster:
+        team_budgets.setdefault(car[1], car[8])
+        versions.setdefault(car[1], car[9])
+    starting_budgets = dict(team_budgets)
+
+    season = []
+    for race, times in zip(calendar, finish_times):
+        race_id, race_name, track_length, track_type, fee, prize_pool = race
+        participants = race_engine.select_participants(roster, fee, team_budgets)
+        if not participants:
+            season.append((race, []))
+            continue
+
+        entrant_times = np.asarray([times[roster_index[car['car_id']]] for car in participants])
+        results = []
+        for position, i in enumerate(race_engine.rank_grid(entrant_times), start=1):
+            car = participants[i]
+            paid = position <= len(race_engine.PRIZE_DISTRIBUTION)
+            prize = prize_pool * race_engine.PRIZE_DISTRIBUTION[position - 1] if paid else 0
+            team_budgets[car['team_id']] += prize
+            results.append({
+                'car_id': car['car_id'],
+                'team_id': car['team_id'],
+                'team_name': car['team_name'],
+                'model': car['model'],
+                'finish_time': float(entrant_times[i]),
+                'position': position,
+                'prize': prize,
+            })
+        season.append((race, results))
+
+    _record_season(pool, season, {
+        team_id: budget - starting_budgets[team_id]
+        for team_id, budget in team_budgets.items()
+        if budget != starting_budgets[team_id]
+    }, versions)
+    return season
+
+
+# Write every race row, all results, the net budget changes and the standings in one transaction
+def _record_season(pool, season, budget_changes, versions):
+    ran = [(race, results) for race, results in season if results]
+    if not ran:
+        return
+    race_ids = pool.next_ids("bootcamp_rally.races.race_id_seq", len(ran))
+    started = datetime.now().replace(microsecond=0)
+    race_rows = []
+    result_rows = []
+    all_results = []
+    for n, (new_race_id, (race, results)) in enumerate(zip(race_ids, ran)):
+        _, race_name, track_length, track_type, fee, prize_pool = race
+        # One second apart, ending now, so history lists the season in calendar
+        # order without dating races in the future
+        race_date = started - timedelta(seconds=len(ran) - 1 - n)
+        race_rows.append((new_race_id, race_name, track_length, track_type, fee, prize_pool, race_date))
+        for result in results:
+            result_rows.append((
+                new_race_id, result['car_id'], result['team_id'],
+                result['finish_time'], result['position'], result['prize']
+            ))
+        all_results.extend(results)
+
+    with pool.transaction() as cur:
+        pool.bulk_insert(cur, "bootcamp_rally.races.races", RACE_COLUMNS, race_rows)
+        pool.bulk_insert(cur, "bootcamp_rally.races.race_results", RESULT_COLUMNS, result_rows)
+        settlement.settle(pool, cur, budget_changes, versions)
+        for query, params in standings.delta_statements(all_results):
+            cur.execute(query, params)
@@ -0,0 +1,48 @@
+import db
+
+# Times a race or season is re-run from fresh budgets when settling conflicts
+MAX_ATTEMPTS = 3
+
+
+# A team's budget changed between reading it and settling against it
+class BudgetConflict(db.WriteConflict):
+    pass
+
+
+# Build the statement applying net budget changes (team_id -> amount) to all teams at once.
+# Every settled team's version is bumped; with `versions` (team_id -> version read
+# with the budgets) a team is only updated if its version is still the same.
+def budget_settlement_statement(budget_changes, versions=None):
+    if versions is None:
+        values = ", ".join(["(?, ?)"] * len(budget_changes))
+        params = [value for team_id, change in budget_changes.items() for value in (team_id, change)]
+        columns = "team_id, budget_change"
+        version_check = ""
+    else:
+        values = ", ".join(["(?, ?, ?)"] * len(budget_changes))
+        params = [
+            value for team_id, change in budget_changes.items()
+            for value in (team_id, change, versions[team_id])
+        ]
+        columns = "team_id, budget_change, version"
+        version_check = " AND t.version = v.version"
+    query = f"""
+    UPDATE bootcamp_rally.teams.teams t
+    SET budget = t.budget + v.budget_change, version = t.version + 1
+    FROM (VALUES {values}) AS v({columns})
+    WHERE t.team_id = v.team_id{version_check}
+    """
+    return query, params
+
+
+# Settle budget changes on a transaction's cursor, compare-and-swap on each team's
+# version. Raises BudgetConflict (rolling the transaction back) if any team changed.
+def settle(pool, cur, budget_changes, versions):
+    if not budget_changes:
+        return
+    cur.execute(*budget_settlement_statement(budget_changes, versions))
+    updated = pool.affected_rows(cur)
+    if updated != len(budget_changes):
+        raise BudgetConflict(
+            f"{len(budget_changes) - updated} of {len(budget_changes)} teams changed since their budgets were read"
+        )
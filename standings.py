@@ -0,0 +1,98 @@
+import race_engine
+
+# Columns every standings table carries, in the order of race_engine.standings_delta
+STAT_COLUMNS = ("points", "entries", "finishes", "wins", "podiums", "total_prize", "total_finish_time")
+
+# Standings tables and the id they are keyed on
+STANDINGS_TABLES = {
+    "team": ("bootcamp_rally.races.team_standings", "team_id"),
+    "car": ("bootcamp_rally.races.car_standings", "car_id"),
+}
+
+
+# MERGE adding one race's delta to a standings table
+def merge_statement(kind, delta):
+    table, key = STANDINGS_TABLES[kind]
+    columns = (key,) + STAT_COLUMNS
+    row_placeholder = "(" + ", ".join(["?"] * len(columns)) + ")"
+    values = ", ".join([row_placeholder] * len(delta))
+    params = [value for key_value, stats in delta.items() for value in (key_value, *stats)]
+    query = f"""
+    MERGE INTO {table} s
+    USING (SELECT * FROM (VALUES {values}) AS v({", ".join(columns)})) d
+    ON s.{key} = d.{key}
+    WHEN MATCHED THEN UPDATE SET
+        {", ".join(f"{column} = s.{column} + d.{column}" for column in STAT_COLUMNS)},
+        updated_at = CURRENT_TIMESTAMP
+    WHEN NOT MATCHED THEN INSERT ({", ".join(columns)})
+        VALUES ({", ".join(f"d.{column}" for column in columns)})
+    """
+    return query, params
+
+
+# Statements updating team and car standings with the results of one race
+def delta_statements(results):
+    if not results:
+        return []
+    return [
+        merge_statement("team", race_engine.standings_delta(results, "team_id")),
+        merge_statement("car", race_engine.standings_delta(results, "car_id")),
+    ]
+
+
+def _points_case():
+    branches = " ".join(
+        f"WHEN {position} THEN {points}"
+        for position, points in enumerate(race_engine.CHAMPIONSHIP_POINTS, start=1)
+    )
+    return f"CASE rr.position {branches} ELSE 0 END"
+
+
+# Recompute a standings table from the full race_results history
+def rebuild_statements(kind):
+    table, key = STANDINGS_TABLES[kind]
+    aggregate = f"""
+    INSERT INTO {table} ({key}, {", ".join(STAT_COLUMNS)})
+    SELECT rr.{key},
+           SUM({_points_case()}),
+           COUNT(*),
+           COUNT(rr.finish_time),
+           SUM(CASE WHEN rr.position = 1 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN rr.position <= 3 THEN 1 ELSE 0 END),
+           COALESCE(SUM(rr.prize_awarded), 0),
+           COALESCE(SUM(rr.finish_time), 0)
+    FROM bootcamp_rally.races.race_results rr
+    GROUP BY rr.{key}
+    """
+    return [(f"DELETE FROM {table}", None), (aggregate, None)]
+
+
+# Repair both standings tables from history in one transaction. `extra` holds
+# totals of results no longer in race_results (archived races), as
+# {"team": delta, "car": delta} in the race_engine.standings_delta layout.
+def rebuild(pool, extra=None):
+    with pool.transaction() as cur:
+        for kind in STANDINGS_TABLES:
+            for query, params in rebuild_statements(kind):
+                cur.execute(query, params)
+            delta = (extra or {}).get(kind)
+            if delta:
+                cur.execute(*merge_statement(kind, delta))
+
+
+TEAM_STANDINGS_QUERY = """
+SELECT t.team_name, s.points, s.wins, s.podiums, s.entries,
+       CAST(s.total_prize AS DOUBLE), s.total_finish_time / NULLIF(s.finishes, 0)
+FROM bootcamp_rally.races.team_standings s
+JOIN bootcamp_rally.teams.teams t ON s.team_id = t.team_id
+ORDER BY s.points DESC, s.wins DESC, t.team_name
+"""
+
+CAR_STANDINGS_QUERY = """
+SELECT t.team_name, c.model, s.points, s.wins, s.podiums, s.entries,
+       CAST(s.total_prize AS DOUBLE), s.total_finish_time / NULLIF(s.finishes, 0)
+FROM bootcamp_rally.races.car_standings s
+JOIN bootcamp_rally.cars.cars c ON s.car_id = c.car_id
+JOIN bootcamp_rally.teams.teams t ON c.team_id = t.team_id
+ORDER BY s.points DESC, s.wins DESC, t.team_name, c.model
+"""
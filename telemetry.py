@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+
+# Where sector split files are written, one per recorded race
+TELEMETRY_DIR = os.environ.get("RALLY_TELEMETRY_DIR", "telemetry")
+
+
+def race_path(race_id, directory=None):
+    return os.path.join(directory or TELEMETRY_DIR, f"race_{race_id}.npz")
+
+
+# Write a segment race to an uncompressed .npz: the float32 (cars x sectors)
+# split times plus car ids, retirement sectors and sector length. Each array is
+# streamed into the archive as-is, so a 1,000 x 1,000 race is about 4 MB.
+def save(path, car_ids, race):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez(
+        path,
+        car_ids=np.asarray(car_ids, dtype=np.int64),
+        splits=race["splits"],
+        dnf_sector=race["dnf_sector"],
+        sector_km=np.float64(race["sector_km"]),
+    )
+    return path
+
+
+# Read a telemetry file back into memory
+def load(path):
+    with np.load(path) as data:
+        return {
+            "car_ids": data["car_ids"],
+            "splits": data["splits"],
+            "dnf_sector": data["dnf_sector"],
+            "sector_km": float(data["sector_km"]),
+        }
+
+
+# Elapsed time of every car at the end of each sector (NaN once retired)
+def cumulative_times(splits):
+    return np.cumsum(splits, axis=1, dtype=np.float64)